@@ -1,4 +1,4 @@
-import { useState, useRef, useCallback, useEffect } from 'react';
+import { useState, useRef, useCallback } from 'react';
 import useWebSocket, { ReadyState } from 'react-use-websocket';
 import { StreamMessage, ChatMessage } from '../types/message';
 
@@ -12,47 +12,54 @@ export const useWebSocketAgent = () => {
   const [finalResult, setFinalResult] = useState<ChatMessage | null>(null);
   const lastAiMessageRef = useRef<ChatMessage | null>(null);
 
-  const { sendMessage, lastMessage, readyState } = useWebSocket(WS_URL, {
-    onOpen: () => {
-      console.log('WebSocket connection established');
-    },
-    onClose: () => {
-      console.log('WebSocket connection closed');
-      setIsLoading(false);
-    },
-    onError: (event) => {
-      console.error('WebSocket error:', event);
-      setIsLoading(false);
-      // Add error message to chat
-      const errorMessage: ChatMessage = {
-        id: Date.now().toString(),
-        type: 'error',
-        content: 'Connection error occurred. Please check your network and try again.',
-        timestamp: new Date(),
-      };
-      setMessages(prev => [...prev, errorMessage]);
-    },
-    shouldReconnect: () => true,
-    reconnectAttempts: 5,
-    reconnectInterval: 3000,
-  });
+  // Id of the AI message that token frames are appended to
+  const streamingIdRef = useRef<string | null>(null);
 
-  // Process incoming WebSocket messages
-  useEffect(() => {
-    if (lastMessage !== null) {
-      try {
-        const data: StreamMessage = JSON.parse(lastMessage.data);
-        processStreamMessage(data);
-      } catch (error) {
-        console.error('Error parsing WebSocket message:', error);
+  const newMessageId = () => Date.now().toString() + Math.random().toString(36).substr(2, 9);
+
+  // Stop appending tokens to the current AI message
+  const finishStreaming = useCallback(() => {
+    const streamingId = streamingIdRef.current;
+    if (streamingId === null) return;
+    streamingIdRef.current = null;
+    setMessages(prev => prev.map(msg => (msg.id === streamingId ? { ...msg, isStreaming: false } : msg)));
+  }, []);
+
+  const processStreamMessage = useCallback((data: StreamMessage) => {
+    const messageId = newMessageId();
+
+    if (data.type === 'token') {
+      const text = data.content || '';
+      const streamingId = streamingIdRef.current;
+      if (streamingId !== null) {
+        setMessages(prev => prev.map(msg => (msg.id === streamingId ? { ...msg, content: msg.content + text } : msg)));
+        return;
       }
+      streamingIdRef.current = messageId;
+      setMessages(prev => [...prev, {
+        id: messageId,
+        type: 'ai',
+        content: text,
+        timestamp: new Date(),
+        isStreaming: true,
+      }]);
+      return;
     }
-  }, [lastMessage]);
 
-  const processStreamMessage = useCallback((data: StreamMessage) => {
-    const messageId = Date.now().toString() + Math.random().toString(36).substr(2, 9);
+    if (data.type === 'tool_start') {
+      finishStreaming();
+      const input = typeof data.input === 'string' ? data.input : JSON.stringify(data.input ?? '');
+      setMessages(prev => [...prev, {
+        id: messageId,
+        type: 'other',
+        content: `${data.name}(${input})`,
+        timestamp: new Date(),
+      }]);
+      return;
+    }
 
     if (data.type === 'end') {
+      finishStreaming();
       setIsLoading(false);
       // Set the last AI message as the final result
       if (lastAiMessageRef.current) {
@@ -62,10 +69,12 @@ export const useWebSocketAgent = () => {
     }
 
     if (data.type === 'error') {
+      finishStreaming();
+      const retry = data.retry_after ? ` Retry in ${Math.ceil(data.retry_after)}s.` : '';
       setMessages(prev => [...prev, {
         id: messageId,
         type: 'error',
-        content: data.detail || 'An error occurred',
+        content: (data.detail || 'An error occurred') + retry,
         timestamp: new Date(),
       }]);
       setIsLoading(false);
@@ -73,7 +82,22 @@ export const useWebSocketAgent = () => {
       return;
     }
 
-    // Create new message for each stream event
+    // The complete AI message replaces the one built from its tokens
+    if (data.type === 'ai' && streamingIdRef.current !== null) {
+      const aiMessage: ChatMessage = {
+        id: streamingIdRef.current,
+        type: 'ai',
+        content: data.content || '',
+        timestamp: new Date(),
+        isStreaming: false,
+      };
+      streamingIdRef.current = null;
+      lastAiMessageRef.current = aiMessage;
+      setMessages(prev => prev.map(msg => (msg.id === aiMessage.id ? aiMessage : msg)));
+      return;
+    }
+
+    // Create new message for each other stream event
     const newMessage: ChatMessage = {
       id: messageId,
       type: data.type as ChatMessage['type'],
@@ -88,7 +112,43 @@ export const useWebSocketAgent = () => {
     }
 
     setMessages(prev => [...prev, newMessage]);
-  }, []);
+  }, [finishStreaming]);
+
+  // Frames are handled in onMessage rather than through lastMessage, which
+  // only holds the latest frame and drops tokens that arrive in one render.
+  const { sendMessage, readyState } = useWebSocket(WS_URL, {
+    onOpen: () => {
+      console.log('WebSocket connection established');
+    },
+    onClose: () => {
+      console.log('WebSocket connection closed');
+      streamingIdRef.current = null;
+      setIsLoading(false);
+    },
+    onError: (event) => {
+      console.error('WebSocket error:', event);
+      setIsLoading(false);
+      // Add error message to chat
+      const errorMessage: ChatMessage = {
+        id: Date.now().toString(),
+        type: 'error',
+        content: 'Connection error occurred. Please check your network and try again.',
+        timestamp: new Date(),
+      };
+      setMessages(prev => [...prev, errorMessage]);
+    },
+    onMessage: (event) => {
+      try {
+        const data: StreamMessage = JSON.parse(event.data);
+        processStreamMessage(data);
+      } catch (error) {
+        console.error('Error parsing WebSocket message:', error);
+      }
+    },
+    shouldReconnect: () => true,
+    reconnectAttempts: 5,
+    reconnectInterval: 3000,
+  });
 
   const sendQuery = useCallback((query: string) => {
     if (readyState !== ReadyState.OPEN) {
@@ -99,6 +159,7 @@ export const useWebSocketAgent = () => {
     // Clear previous final result
     setFinalResult(null);
     lastAiMessageRef.current = null;
+    streamingIdRef.current = null;
 
     // Add user message
     const userMessage: ChatMessage = {
@@ -119,6 +180,7 @@ export const useWebSocketAgent = () => {
     setMessages([]);
     setFinalResult(null);
     lastAiMessageRef.current = null;
+    streamingIdRef.current = null;
     setIsLoading(false);
   }, []);
 
@@ -1,8 +1,12 @@
 export interface StreamMessage {
-  type: 'ai' | 'tool_result' | 'other' | 'end' | 'error';
+  type: 'token' | 'tool_start' | 'ai' | 'tool_result' | 'other' | 'end' | 'error';
   content?: string;
+  node?: string;
+  name?: string;
+  input?: unknown;
   detail?: string;
   trace?: string;
+  retry_after?: number;
 }
 
 export interface ChatMessage {
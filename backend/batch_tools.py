@@ -0,0 +1,504 @@
+import ast
+import inspect
+import json
+import logging
+import math
+import os
+import textwrap
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+from log_utils import log_event
+from tool_dedup import _inline_temporaries, _strip_docstring, _StripFolder
+
+logger = logging.getLogger("agent")
+
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "1000000"))
+BATCH_PREVIEW = int(os.getenv("BATCH_PREVIEW", "20"))
+# batch_apply's file: and output: paths are relative to this directory; the
+# path comes from the model, so nothing outside it can be read or written.
+BATCH_DATA_DIR = os.getenv("BATCH_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_data"))
+# Never fanned out: a web search per row, or tools that manage other tools.
+BATCH_EXCLUDED_TOOLS = ("batch_apply", "search_duckduckgo", "tool_generator", "tool_lookup")
+
+
+# Batch evaluation of the one-string-in, one-number-out tools ("a,b" -> a+b).
+#
+# A tool body is compiled into an element-wise NumPy function when, after the
+# temporaries are inlined the same way tool_dedup fingerprints them, it is a
+# single `return <expr>` over float() fields of `input`, arithmetic,
+# comparisons, conditional expressions and a few math functions. All inputs
+# are then parsed with one split and one float conversion and evaluated in one
+# pass. Anything else, and any row whose vector result is not finite (where
+# the scalar tool might raise ZeroDivisionError or OverflowError, or return
+# its own sentinel), goes through the tool itself, one call per row, so
+# results always match the scalar tool. Rows where the scalar tool would
+# return an int (math.floor, int constants) are converted back to int.
+class _NotVectorizable(Exception):
+    pass
+
+
+_UNARY_FUNCS = {
+    "abs": np.abs, "fabs": np.abs, "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10,
+    "log2": np.log2, "sin": np.sin, "cos": np.cos, "tan": np.tan, "floor": np.floor, "ceil": np.ceil,
+}
+_BINARY_FUNCS = {"min": np.minimum, "max": np.maximum, "pow": np.power, "hypot": np.hypot, "atan2": np.arctan2}
+_BIN_OPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide, ast.Mod: np.remainder, ast.Pow: np.power,
+}
+_COMPARE_OPS = {
+    ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+}
+
+Vector = Callable[[np.ndarray], Any]
+
+
+def _func_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "math":
+        return node.attr
+    return None
+
+
+def _is_input(node: ast.expr) -> bool:
+    return isinstance(node, ast.Name) and node.id == "input"
+
+
+# Compiles one expression into a function of the (rows, fields) float matrix.
+class _Compiler:
+    def __init__(self):
+        self.fields = 0
+        self.sep: Optional[str] = None
+        self.whole_input = False
+
+    def _split_sep(self, node: ast.expr) -> Optional[str]:
+        # input.split(SEP), the only way fields are taken out of the input
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "split"
+                and _is_input(node.func.value) and len(node.args) == 1 and not node.keywords
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            return node.args[0].value
+        return None
+
+    def _column(self, index: int, sep: str) -> Vector:
+        if self.whole_input or (self.sep is not None and self.sep != sep) or index < 0:
+            raise _NotVectorizable("mixed field access")
+        self.sep = sep
+        self.fields = max(self.fields, index + 1)
+        return lambda cols: cols[:, index]
+
+    # float(<field>) where <field> is input, input.split(s)[i] or either with .strip()
+    def _float_field(self, node: ast.expr) -> Vector:
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "strip" \
+                and not node.args:
+            node = node.func.value
+        if _is_input(node):
+            if self.sep is not None:
+                raise _NotVectorizable("mixed field access")
+            self.whole_input = True
+            self.fields = 1
+            return lambda cols: cols[:, 0]
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant) \
+                and isinstance(node.slice.value, int):
+            sep = self._split_sep(node.value)
+            if sep is not None:
+                return self._column(node.slice.value, sep)
+        raise _NotVectorizable(ast.dump(node))
+
+    def compile(self, node: ast.expr) -> Vector:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda cols: value
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            op, left, right = _BIN_OPS[type(node.op)], self.compile(node.left), self.compile(node.right)
+            return lambda cols: op(left(cols), right(cols))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.compile(node.operand)
+            sign = -1.0 if isinstance(node.op, ast.USub) else 1.0
+            return lambda cols: sign * operand(cols)
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = self.compile_test(node.test), self.compile(node.body), self.compile(node.orelse)
+            return lambda cols: np.where(test(cols), body(cols), orelse(cols))
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant) \
+                and isinstance(node.slice.value, int):
+            # map(float, input.split(s))[i], what `a, b = map(float, ...)` inlines to
+            mapped = node.value
+            if isinstance(mapped, ast.Call) and _func_name(mapped.func) == "list" and len(mapped.args) == 1:
+                mapped = mapped.args[0]
+            if (isinstance(mapped, ast.Call) and _func_name(mapped.func) == "map" and len(mapped.args) == 2
+                    and _func_name(mapped.args[0]) == "float"):
+                sep = self._split_sep(mapped.args[1])
+                if sep is not None:
+                    return self._column(node.slice.value, sep)
+        if isinstance(node, ast.Call) and not node.keywords:
+            name = _func_name(node.func)
+            if name == "float" and len(node.args) == 1:
+                arg = node.args[0]
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                    value = float(arg.value)  # float('nan'), float('inf')
+                    return lambda cols: value
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, (int, float)):
+                    value = float(arg.value)
+                    return lambda cols: value
+                try:
+                    return self._float_field(arg)
+                except _NotVectorizable:
+                    inner = self.compile(arg)  # float(a + b)
+                    return lambda cols: inner(cols)
+            if name in _UNARY_FUNCS and len(node.args) == 1:
+                fn, arg = _UNARY_FUNCS[name], self.compile(node.args[0])
+                return lambda cols: fn(arg(cols))
+            if name in _BINARY_FUNCS and len(node.args) == 2:
+                fn, a, b = _BINARY_FUNCS[name], self.compile(node.args[0]), self.compile(node.args[1])
+                return lambda cols: fn(a(cols), b(cols))
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "math" \
+                and node.attr in ("pi", "e", "inf", "nan", "tau"):
+            value = getattr(math, node.attr)
+            return lambda cols: value
+        raise _NotVectorizable(type(node).__name__)
+
+    # Per row, whether Python would return an int for this expression (True,
+    # False, or a bool array where an IfExp / min / max picks per row).
+    def int_rows(self, node: ast.expr) -> Vector:
+        if isinstance(node, ast.Constant):
+            is_int = isinstance(node.value, int)
+            return lambda cols: is_int
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            if isinstance(node.op, ast.Div):
+                return lambda cols: False
+            left, right = self.int_rows(node.left), self.int_rows(node.right)
+            if isinstance(node.op, ast.Pow):
+                exponent = self.compile(node.right)
+                return lambda cols: np.logical_and(np.logical_and(left(cols), right(cols)), exponent(cols) >= 0)
+            return lambda cols: np.logical_and(left(cols), right(cols))
+        if isinstance(node, ast.UnaryOp):
+            return self.int_rows(node.operand)
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = self.compile_test(node.test), self.int_rows(node.body), self.int_rows(node.orelse)
+            return lambda cols: np.where(test(cols), body(cols), orelse(cols))
+        if isinstance(node, ast.Call):
+            name = _func_name(node.func)
+            if name in ("floor", "ceil"):
+                return lambda cols: True
+            if name == "abs":
+                return self.int_rows(node.args[0])
+            if name in ("min", "max"):
+                # min(a, b) is a unless b < a; max(a, b) is a unless b > a
+                a, b = self.compile(node.args[0]), self.compile(node.args[1])
+                ka, kb = self.int_rows(node.args[0]), self.int_rows(node.args[1])
+                keep_a = np.greater_equal if name == "min" else np.less_equal
+                return lambda cols: np.where(keep_a(b(cols), a(cols)), ka(cols), kb(cols))
+            if name == "pow":
+                return self.int_rows(ast.BinOp(left=node.args[0], op=ast.Pow(), right=node.args[1]))
+        return lambda cols: False
+
+    def compile_test(self, node: ast.expr) -> Vector:
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+            operands = [self.compile(node.left)] + [self.compile(c) for c in node.comparators]
+            ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+
+            def compare(cols):
+                values = [operand(cols) for operand in operands]
+                result = True
+                for op, left, right in zip(ops, values, values[1:]):
+                    result = np.logical_and(result, op(left, right))
+                return result
+            return compare
+        if isinstance(node, ast.BoolOp):
+            parts = [self.compile_test(v) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda cols: combine.reduce([np.broadcast_to(p(cols), cols.shape[:1]) for p in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.compile_test(node.operand)
+            return lambda cols: np.logical_not(operand(cols))
+        raise _NotVectorizable(type(node).__name__)
+
+
+# Element-wise version of one tool body: `fields` float columns split on `sep`
+# (None: the whole input is one number).
+class VectorPlan:
+    def __init__(self, fn: Vector, fields: int, sep: Optional[str], is_int: Optional[Vector] = None):
+        self.fn = fn
+        self.fields = fields
+        self.sep = sep
+        self.is_int = is_int or (lambda cols: False)
+
+    def __call__(self, cols: np.ndarray) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            result = self.fn(cols)
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), cols.shape[:1])
+
+    def int_rows(self, cols: np.ndarray) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            result = self.is_int(cols)
+        return np.broadcast_to(np.asarray(result, dtype=bool), cols.shape[:1])
+
+
+def compile_function(func: ast.FunctionDef) -> Optional[VectorPlan]:
+    body = _inline_temporaries(_strip_docstring(func.body))
+    body = [_StripFolder().visit(stmt) for stmt in body]
+    if len(body) != 1 or not isinstance(body[0], ast.Return) or body[0].value is None:
+        return None
+    compiler = _Compiler()
+    try:
+        fn = compiler.compile(body[0].value)
+        is_int = compiler.int_rows(body[0].value)
+    except (_NotVectorizable, ValueError):
+        return None
+    if compiler.fields == 0:
+        return None  # constant tool: nothing to vectorize over
+    return VectorPlan(fn, compiler.fields, compiler.sep, is_int)
+
+
+# FunctionDef of a tool, from its file when the tool object only wraps it (a
+# sandboxed copy), else from the unwrapped function's own source.
+def tool_function_ast(tool_fn: Any, path: Optional[str] = None, name: Optional[str] = None) -> Optional[ast.FunctionDef]:
+    name = name or getattr(tool_fn, "name", None) or getattr(tool_fn, "__name__", None)
+    try:
+        if path:
+            with open(path) as f:
+                tree = ast.parse(f.read())
+        else:
+            func = inspect.unwrap(getattr(tool_fn, "func", tool_fn))
+            tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    except (OSError, TypeError, SyntaxError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            return node
+    return None
+
+
+# Compiled plans per tool object; None records "not vectorizable". load_tool
+# hands out a new object when a tool file changes, so stale plans are never hit.
+_plans: Dict[Tuple[int, Optional[str]], Optional[VectorPlan]] = {}
+_plans_lock = threading.Lock()
+
+def get_plan(tool_fn: Any, path: Optional[str] = None) -> Optional[VectorPlan]:
+    key = (id(tool_fn), path)
+    if key in _plans:
+        return _plans[key]
+    func = tool_function_ast(tool_fn, path)
+    plan = compile_function(func) if func is not None else None
+    with _plans_lock:
+        _plans[key] = plan
+    return plan
+
+
+def _as_input(row: Any) -> str:
+    if isinstance(row, str):
+        return row
+    if isinstance(row, (list, tuple, np.ndarray)):
+        return ",".join(repr(float(v)) if isinstance(v, (int, float, np.number)) else str(v) for v in row)
+    return repr(float(row)) if isinstance(row, (int, float, np.number)) else str(row)
+
+
+# (rows, fields) float matrix and a mask of the rows that parsed. String rows
+# are parsed with one join/split and one float conversion; rows with the wrong
+# field count or a non-number are left to the scalar path.
+def parse_columns(inputs: Sequence[Any], fields: int, sep: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(inputs)
+    if isinstance(inputs, np.ndarray) and inputs.dtype.kind in "iuf":
+        cols = inputs.reshape(n, -1).astype(np.float64, copy=False)
+        # The scalar tool sees each row joined with "," (see _as_input), so a
+        # row only matches it as one bare number, or as exactly `fields`
+        # comma-separated numbers. Everything else goes to the scalar path.
+        width = cols.shape[1]
+        if inputs.ndim <= 2 and ((sep is None and width == 1) or (sep == "," and width == fields)):
+            return cols, np.ones(n, dtype=bool)
+        return np.zeros((n, fields)), np.zeros(n, dtype=bool)
+    if n and not isinstance(inputs[0], str):
+        try:
+            array = np.asarray(inputs, dtype=np.float64)
+        except (TypeError, ValueError):
+            array = None
+        if array is not None and array.ndim <= 2:
+            return parse_columns(array, fields, sep)
+    rows = [_as_input(r) for r in inputs]
+    if sep is None:
+        counts_ok = np.ones(n, dtype=bool)
+        parts = rows
+    else:
+        counts_ok = np.fromiter((r.count(sep) == fields - 1 for r in rows), dtype=bool, count=n)
+        good = rows if counts_ok.all() else [r for r, ok in zip(rows, counts_ok) if ok]
+        parts = sep.join(good).split(sep) if good else []
+    try:
+        values = np.array(parts, dtype=np.float64)
+        ok = counts_ok
+    except ValueError:
+        # Some field is not a number: parse the plausible rows one by one.
+        values, ok = [], counts_ok.copy()
+        for i, row in enumerate(rows):
+            if not ok[i]:
+                continue
+            try:
+                values.extend(float(p) for p in (row.split(sep) if sep is not None else [row]))
+            except ValueError:
+                ok[i] = False
+        values = np.array(values, dtype=np.float64)
+    cols = np.zeros((n, fields))
+    cols[ok] = values.reshape(-1, fields)
+    return cols, ok
+
+
+# Outcome of one batch: results in input order (None where the row failed),
+# per-row error messages, and how many rows took the vector path.
+class BatchResult:
+    def __init__(self, tool: str, results: List[Any], errors: Dict[int, str], vectorized: int, seconds: float):
+        self.tool = tool
+        self.results = results
+        self.errors = errors
+        self.vectorized = vectorized
+        self.seconds = seconds
+
+    def summary(self, preview: int = BATCH_PREVIEW) -> Dict[str, Any]:
+        numbers = np.array([r for r in self.results if isinstance(r, (int, float)) and not isinstance(r, bool)],
+                           dtype=np.float64)
+        summary: Dict[str, Any] = {
+            "tool": self.tool,
+            "count": len(self.results),
+            "vectorized": self.vectorized,
+            "errors": len(self.errors),
+            "results": self.results[:preview],
+        }
+        finite = numbers[np.isfinite(numbers)]
+        if finite.size:
+            summary.update(sum=float(finite.sum()), mean=float(finite.mean()),
+                           min=float(finite.min()), max=float(finite.max()))
+        if finite.size < numbers.size:
+            summary["non_finite"] = int(numbers.size - finite.size)
+        if self.errors:
+            summary["first_errors"] = {str(i): msg for i, msg in list(self.errors.items())[:5]}
+        return summary
+
+
+# Runs `tool_fn` over every input. `path` points at the tool's source file when
+# tool_fn is a wrapper (sandboxed or cached) whose own code is not the body.
+def batch_invoke(tool_fn: Any, inputs: Sequence[Any], path: Optional[str] = None,
+                 vectorize: bool = True) -> BatchResult:
+    start = time.perf_counter()
+    name = getattr(tool_fn, "name", getattr(tool_fn, "__name__", "tool"))
+    n = len(inputs)
+    if n > BATCH_MAX_ROWS:
+        raise ValueError(f"Batch of {n} rows exceeds BATCH_MAX_ROWS={BATCH_MAX_ROWS}")
+    scalar = getattr(tool_fn, "func", tool_fn)
+    results: List[Any] = [None] * n
+    errors: Dict[int, str] = {}
+    plan = get_plan(tool_fn, path) if vectorize and n else None
+    todo = range(n)
+    vectorized = 0
+    if plan is not None:
+        cols, ok = parse_columns(inputs, plan.fields, plan.sep)
+        values = plan(cols)
+        ints = plan.int_rows(cols)
+        ok &= np.isfinite(values)
+        # Python ints are exact where float64 is not; leave those rows to the tool.
+        ok &= ~ints | (np.abs(values) < 2.0 ** 53)
+        vectorized = int(ok.sum())
+        for i in np.flatnonzero(ok):
+            results[i] = int(values[i]) if ints[i] else float(values[i])
+        todo = np.flatnonzero(~ok)
+    for i in todo:
+        try:
+            results[i] = scalar(_as_input(inputs[i]))
+        except Exception as e:
+            # The exception type only: messages like float()'s quote the input row.
+            errors[int(i)] = type(e).__name__
+    elapsed = time.perf_counter() - start
+    log_event(logger, logging.INFO, "batch_invoke", tool=name, rows=n, vectorized=vectorized,
+              errors=len(errors), ms=round(elapsed * 1000, 2))
+    return BatchResult(name, results, errors, vectorized, elapsed)
+
+
+# `name` inside BATCH_DATA_DIR. Absolute paths, ".." and symlinks that lead
+# out of the directory are refused.
+def data_path(name: str) -> str:
+    if not name or os.path.isabs(name) or ".." in name.replace("\\", "/").split("/"):
+        raise ValueError(f"paths must be relative to the batch data directory: {name!r}")
+    root = os.path.realpath(BATCH_DATA_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"paths must be relative to the batch data directory: {name!r}")
+    return path
+
+
+def _read_inputs(name: str) -> List[str]:
+    path = data_path(name)
+    try:
+        if path.endswith(".npy"):
+            return np.load(path)
+        with open(path) as f:
+            if path.endswith(".json"):
+                return json.load(f)
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        raise ValueError(f"no such input file: {name!r}") from None
+    except Exception as e:
+        raise ValueError(f"could not read input file {name!r} ({type(e).__name__})") from None
+
+
+def _write_results(name: str, result: BatchResult) -> None:
+    path = data_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for i, value in enumerate(result.results):
+            f.write(f"{value if i not in result.errors else ''}\n")
+    os.replace(tmp_path, path)
+
+
+BATCH_TOOL_DESCRIPTION = """
+Runs another tool over many inputs in one step and returns a summary (count,
+errors, sum/mean/min/max and the first results).
+
+Input format (pipe-separated):
+tool: TOOL_NAME | inputs: JSON_LIST
+tool: TOOL_NAME | file: PATH [| output: PATH]
+
+Examples:
+tool: addition | inputs: ["1,2", "3,4", "5,6"]
+tool: divide_numbers | file: pairs.txt | output: quotients.txt
+
+Files are names inside the batch data directory. A file holds one tool input
+per line (or a JSON list, or a .npy array); with output every result is
+written there, one per line.
+""".strip()
+
+
+# The batch_apply tool for a tool set. `resolve(name)` returns (tool, source
+# path or None), or raises ValueError for unknown tools.
+def make_batch_tool(resolve: Callable[[str], Tuple[Any, Optional[str]]]) -> StructuredTool:
+    def batch_apply(input: str) -> str:
+        params = {}
+        for part in input.split("|"):
+            if ":" in part:
+                key, value = part.split(":", 1)
+                params[key.strip().lower()] = value.strip()
+        try:
+            if params["tool"] in BATCH_EXCLUDED_TOOLS:
+                return f"❌ Failed: '{params['tool']}' cannot be run in batch"
+            tool_fn, path = resolve(params["tool"])
+            if "inputs" in params:
+                inputs = json.loads(params["inputs"])
+            elif "file" in params:
+                inputs = _read_inputs(params["file"])
+            else:
+                return "❌ Failed: give either 'inputs: [...]' or 'file: PATH'"
+            result = batch_invoke(tool_fn, inputs, path=path)
+            summary = result.summary()
+            if params.get("output"):
+                _write_results(params["output"], result)
+                summary["output"] = params["output"]
+            return json.dumps(summary, default=str)
+        except KeyError:
+            return "❌ Failed: missing 'tool: NAME'"
+        except Exception as e:
+            return f"❌ Failed: {e}"
+
+    return StructuredTool.from_function(func=batch_apply, name="batch_apply", description=BATCH_TOOL_DESCRIPTION)
@@ -0,0 +1,66 @@
+"""
+Concurrency check for agent.run_agent against a slow stand-in LLM.
+
+Fires N simultaneous queries. Every LLM call sleeps for --latency seconds.
+If load_and_use_tool blocked the event loop, the queries would serialize:
+wall time would be about N * latency, and the loop-lag probe would stall for
+the whole run. With the agent pool they overlap, so wall time is about
+ceil(N / AGENT_MAX_WORKERS) * latency. Run from the backend directory:
+
+    AGENT_MAX_WORKERS=50 python benchmarks/bench_agent_concurrency.py
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+os.environ.setdefault("AGENT_VERBOSE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent  # noqa: E402
+from fake_llm import ScriptedLLM  # noqa: E402
+
+
+async def loop_lag_probe(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def main(queries: int, latency: float) -> None:
+    agent.logger.setLevel("WARNING")
+    agent.llm = ScriptedLLM(responses=["Final Answer: 42"], latency=latency)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(agent.run_agent(f"query {i}: what is 6*7?") for i in range(queries)))
+    wall = time.perf_counter() - start
+    stop.set()
+    worst_lag = await probe
+
+    ok = sum(1 for r in results if r["response"]["result"] == "42")
+    serial = queries * latency
+    expected = math.ceil(queries / agent.AGENT_MAX_WORKERS) * latency
+    print(f"queries:          {queries} ({ok} answered)")
+    print(f"llm latency:      {latency:.2f} s")
+    print(f"wall time:        {wall:.2f} s (serial would be {serial:.2f} s, pool bound {expected:.2f} s)")
+    print(f"overlapping:      {'yes' if wall < serial / 2 else 'NO'}")
+    print(f"worst loop lag:   {worst_lag * 1000:.1f} ms")
+    print(f"pool stats:       {agent.agent_pool_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.latency))
@@ -0,0 +1,70 @@
+"""
+Evaluating a column of inputs: one tool call per row against batch_invoke.
+
+For each tool, --rows random "a,b" inputs are evaluated three ways:
+
+- invoke: tool.invoke per row, the way the agent calls a tool
+- func: the bare Python function per row, a lower bound for any per-row loop
+- batch: batch_tools.batch_invoke (vectorized parse and NumPy evaluation,
+  scalar fallback for non-finite rows)
+
+--zero-rate sets the fraction of rows with a zero second field. Those rows
+take the scalar path for division. Run from the backend directory:
+
+    python benchmarks/bench_batch_tools.py --rows 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+
+import test_resoning  # noqa: E402
+from batch_tools import batch_invoke  # noqa: E402
+
+
+def per_row(fn, inputs):
+    out = []
+    for value in inputs:
+        try:
+            out.append(fn(value))
+        except Exception:
+            out.append(None)
+    return out
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--zero-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    inputs = [f"{rng.uniform(-1e3, 1e3):.4f}, {0 if rng.random() < args.zero_rate else rng.uniform(-50, 50):.4f}"
+              for _ in range(args.rows)]
+
+    print(f"{args.rows} rows, {args.zero_rate:.0%} zero divisors")
+    print(f"{'tool':>15} {'invoke ms':>10} {'func ms':>8} {'batch ms':>9} {'vs invoke':>10} {'vs func':>8} {'vector rows':>12}")
+    for tool in (test_resoning.addition, test_resoning.multiplication, test_resoning.division):
+        _, invoke_s = timed(lambda: per_row(lambda v: tool.invoke({"input": v}), inputs))
+        func_results, func_s = timed(lambda: per_row(tool.func, inputs))
+        batch, batch_s = timed(lambda: batch_invoke(tool, inputs))
+        mismatches = sum(1 for a, b in zip(func_results, batch.results) if a != b and not (a != a and b != b))
+        assert mismatches == 0, f"{tool.name}: {mismatches} rows differ from the scalar tool"
+        print(f"{tool.name:>15} {invoke_s * 1000:>10.1f} {func_s * 1000:>8.1f} {batch_s * 1000:>9.1f} "
+              f"{invoke_s / batch_s:>9.0f}x {func_s / batch_s:>7.1f}x {batch.vectorized:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-request graph compilation against one shared compiled graph (testings/main2.py).
+
+Each request runs the three-node graph against a stand-in LLM that answers
+immediately, so the numbers isolate graph construction and dispatch cost.
+Run from the backend directory:
+
+    python benchmarks/bench_graph_compile.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("AGENT_VERBOSE", "false")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+import main2  # noqa: E402
+from fake_llm import ScriptedLLM  # noqa: E402
+
+REQUESTS = 200
+
+
+async def run(graph) -> None:
+    state = main2.AgentState(messages=[HumanMessage(content="what is 6*7?")])
+    await graph.ainvoke(state, config=main2._run_config(str(uuid.uuid4())))
+
+
+async def measure(per_request_compile: bool):
+    samples = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        graph = main2.build_graph() if per_request_compile else main2.graph
+        await run(graph)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main():
+    main2.logger.setLevel("WARNING")
+    main2.llm = ScriptedLLM(responses=["Final Answer: 42"], latency=0)
+    main2.load_tool = lambda tool_name=None: []
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        main2.build_graph()
+    compile_ms = (time.perf_counter() - start) * 1000 / REQUESTS
+
+    await measure(False)  # warm-up
+    print(f"build_graph() alone: {compile_ms:.2f} ms")
+    print(f"{'mode':>22} {'p50 ms':>8} {'mean ms':>8}")
+    for label, per_request in (("compile per request", True), ("shared compiled graph", False)):
+        samples = await measure(per_request)
+        print(f"{label:>22} {statistics.median(samples):>8.2f} {statistics.mean(samples):>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark for both agent graphs, fully offline.
+
+Runs agent.run_agent (the ReAct graph) and the testings/test_resoning.py
+tool-calling graph against the scripted LLM from fake_llm.py, with the LLM
+response cache off. For each concurrency level it sends --requests arithmetic
+queries, at most that many in flight at once, and reports:
+
+- throughput
+- p50/p95/p99 end-to-end latency
+- mean time per graph node per request
+
+Run from the backend directory:
+
+    python benchmarks/bench_graphs.py
+    python benchmarks/bench_graphs.py --graph agent --concurrency 1,8,32 --latency 0.2 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+os.environ.setdefault("AGENT_VERBOSE", "false")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+import agent  # noqa: E402
+import test_resoning  # noqa: E402
+from fake_llm import scripted  # noqa: E402
+
+
+# Wall time per LangGraph node, from the chain callbacks of the node runs.
+class NodeTimer(BaseCallbackHandler):
+    def __init__(self):
+        self.started: Dict[Any, tuple] = {}
+        self.totals: Dict[str, float] = defaultdict(float)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self.started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id):
+        started = self.started.pop(run_id, None)
+        if started:
+            self.totals[started[0]] += time.perf_counter() - started[1]
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def make_queries(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    ops = [("add", "+"), ("divide", "/")]
+    queries = []
+    for _ in range(n):
+        verb, op = rng.choice(ops)
+        queries.append(f"{verb} these numbers: {rng.randint(1, 9999)}{op}{rng.randint(1, 99)}")
+    return queries
+
+
+async def run_agent_graph(query: str, timer: NodeTimer) -> None:
+    await agent.run_agent(query, config={"callbacks": [timer]})
+
+
+async def run_reasoning_graph(query: str, timer: NodeTimer) -> None:
+    await test_resoning.app.ainvoke({"messages": [HumanMessage(content=query)]}, config={"callbacks": [timer]})
+
+
+GRAPHS = {"agent": run_agent_graph, "reasoning": run_reasoning_graph}
+
+
+async def run_level(graph: str, concurrency: int, queries: List[str]) -> Dict[str, Any]:
+    timer = NodeTimer()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(query: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await GRAPHS[graph](query, timer)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    wall = time.perf_counter() - start
+    return {
+        "graph": graph,
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "wall_s": wall,
+        "throughput_rps": len(queries) / wall,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "node_ms": {node: 1000 * total / len(queries) for node, total in sorted(timer.totals.items())},
+    }
+
+
+async def main(args) -> None:
+    agent.logger.setLevel("WARNING")
+    for llm in (scripted(agent.llm), scripted(test_resoning.llm)):
+        llm.latency = args.latency
+        llm.token_latency = args.token_latency
+    queries = make_queries(args.requests)
+    graphs = list(GRAPHS) if args.graph == "both" else [args.graph]
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    print(f"llm latency {args.latency * 1000:.0f} ms + {args.token_latency * 1000:.1f} ms/token, "
+          f"{args.requests} requests per level, agent pool {agent.AGENT_MAX_WORKERS} workers")
+    print(f"{'graph':<10}{'conc':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>5}  per-node ms")
+    results = []
+    for graph in graphs:
+        # Warm-up: first executor build, tool imports, index sync.
+        await run_level(graph, 1, queries[:2])
+        for level in levels:
+            r = await run_level(graph, level, queries)
+            results.append(r)
+            nodes = ", ".join(f"{n}={ms:.1f}" for n, ms in r["node_ms"].items())
+            print(f"{graph:<10}{level:>5}{r['throughput_rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                  f"{r['p99_ms']:>9.1f}{r['errors']:>5}  {nodes}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", choices=["agent", "reasoning", "both"], default="both")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per output token")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
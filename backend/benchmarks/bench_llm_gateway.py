@@ -0,0 +1,119 @@
+"""
+A burst of batch LLM calls with interactive calls arriving behind it, with and
+without the LLM gateway.
+
+--batch calls are submitted at once from a thread per call. After --delay
+seconds, --interactive calls arrive one every 20 ms. The provider is the
+scripted fake LLM (--latency seconds per call), behind CachedLLM with the
+cache off, called through the synchronous invoke path.
+
+- ungated: every call goes straight to the provider
+- gated: an LLMGateway with --concurrency slots, --rpm requests per minute
+  and a queue of --queue-size. Interactive calls jump the batch queue. Calls
+  that find the queue full are rejected with LLMOverloaded.
+
+For each run the table shows the provider's peak in-flight calls, the
+requests per second, and the latency percentiles by priority. Run from the
+backend directory:
+
+    python benchmarks/bench_llm_gateway.py --batch 200 --interactive 20
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["LLM_GATEWAY"] = "off"  # the ungated run must not pick up the global gateway
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import ScriptedLLM  # noqa: E402
+from llm_cache import CachedLLM  # noqa: E402
+from llm_gateway import LLMGateway, LLMOverloaded, llm_priority  # noqa: E402
+
+
+# Counts calls in flight at the provider.
+class ProbedLLM(ScriptedLLM):
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        probe = self.metadata["probe"]
+        with probe["lock"]:
+            probe["in_flight"] += 1
+            probe["peak"] = max(probe["peak"], probe["in_flight"])
+        try:
+            return super()._call(prompt, stop, run_manager, **kwargs)
+        finally:
+            with probe["lock"]:
+                probe["in_flight"] -= 1
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(args, gateway):
+    probe = {"lock": threading.Lock(), "in_flight": 0, "peak": 0}
+    llm = CachedLLM(llm=ProbedLLM(responses=["Final Answer: ok"], latency=args.latency, metadata={"probe": probe}),
+                    enabled=False, gateway=gateway)
+    latencies = {"interactive": [], "batch": []}
+    rejected = {"interactive": 0, "batch": 0}
+    lock = threading.Lock()
+
+    def call(priority, n):
+        start = time.perf_counter()
+        try:
+            with llm_priority(priority):
+                llm.invoke(f"{priority} question {n}: what is {n} + {n}?")
+        except LLMOverloaded:
+            with lock:
+                rejected[priority] += 1
+            return
+        with lock:
+            latencies[priority].append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.batch + args.interactive) as threads:
+        futures = [threads.submit(call, "batch", n) for n in range(args.batch)]
+        time.sleep(args.delay)
+        for n in range(args.interactive):
+            futures.append(threads.submit(call, "interactive", n))
+            time.sleep(0.02)
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    served = len(latencies["interactive"]) + len(latencies["batch"])
+    return probe["peak"], served / elapsed, latencies, rejected
+
+
+def main() -> None:
+    logging.getLogger("agent").setLevel(logging.ERROR)  # skip the warning logged per rejection
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=6000)
+    parser.add_argument("--queue-size", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{args.batch} batch calls, then {args.interactive} interactive calls, {args.latency * 1000:.0f} ms per call")
+    print(f"{'run':>8} {'peak':>5} {'req/s':>7} {'interactive p50/p95 ms':>23} {'batch p50/p95 ms':>17} {'rejected':>9}")
+    gateway = LLMGateway(max_concurrency=args.concurrency, rpm=args.rpm, queue_size=args.queue_size, queue_timeout=60)
+    for name, gw in (("ungated", None), ("gated", gateway)):
+        peak, rate, latencies, rejected = run(args, gw)
+        inter = "/".join(f"{1000 * percentile(latencies['interactive'], q):.0f}" for q in (0.5, 0.95))
+        batch = "/".join(f"{1000 * percentile(latencies['batch'], q):.0f}" for q in (0.5, 0.95))
+        print(f"{name:>8} {peak:>5} {rate:>7.1f} {inter:>23} {batch:>17} "
+              f"{rejected['interactive'] + rejected['batch']:>9}")
+    stats = gateway.stats()
+    print(f"gateway: admitted {stats['admitted_by_priority']}, rejected {stats['rejected']}, "
+          f"timed out {stats['timed_out']}, avg wait {stats['avg_wait_ms']:.0f} ms, max wait {stats['max_wait_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
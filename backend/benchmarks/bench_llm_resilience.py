@@ -0,0 +1,137 @@
+"""
+Tail latency and success rate of LLM calls against a heavy-tailed provider,
+with and without ResilientLLM.
+
+The stand-in provider is the scripted fake LLM with a random delay. The delay
+is lognormal around --median seconds. With probability --tail-rate it is
+multiplied by a Pareto(1.5) factor, so a few calls take many times the
+median. With probability --error-rate the call raises ConnectionError right
+away. --calls calls are made from --threads threads through invoke(), the way
+both graphs call the LLM, after --warmup calls that fill the latency window.
+
+- plain: the provider as is
+- retry: per-attempt deadline of --timeout seconds, jittered backoff retries
+- hedge: retry, plus a duplicate request after the p95 of recent calls
+
+Both wrapped runs go through an LLMGateway with --concurrency slots. Every
+attempt and hedge takes its own slot, and a hedge is skipped when no slot
+is free. "peak" is the most requests the provider had in flight at once.
+
+"provider calls" counts the requests the provider saw, hedges and retries
+included. Run from the backend directory:
+
+    python benchmarks/bench_llm_resilience.py --calls 400
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import ScriptedLLM  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from llm_resilience import ResilientLLM  # noqa: E402
+
+
+class HeavyTailLLM(ScriptedLLM):
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        shape = self.metadata
+        with self._lock:
+            shape["in_flight"] += 1
+            shape["peak"] = max(shape["peak"], shape["in_flight"])
+            rng = shape["rng"]
+            delay = shape["median"] * math.exp(rng.gauss(0, 0.25))
+            if rng.random() < shape["tail_rate"]:
+                delay *= min(rng.paretovariate(1.5) * 5, 100)
+            fail = rng.random() < shape["error_rate"]
+        try:
+            if fail:
+                self._respond(prompt)
+                raise ConnectionError("connection reset by provider")
+            text = self._respond(prompt)
+            time.sleep(delay)
+            return text
+        finally:
+            with self._lock:
+                shape["in_flight"] -= 1
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)] if values else float("nan")
+
+
+def run(llm, calls: int, threads: int):
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def call(n):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            llm.invoke(f"question {n}")
+        except Exception:
+            with lock:
+                failures += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(call, range(calls)))
+    return latencies, failures
+
+
+def main() -> None:
+    logging.getLogger("agent").setLevel(logging.ERROR)  # skip the warning logged per retry
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--median", type=float, default=0.05)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=12)
+    args = parser.parse_args()
+
+    def provider():
+        shape = {"rng": random.Random(0), "median": args.median, "tail_rate": args.tail_rate,
+                 "error_rate": args.error_rate, "in_flight": 0, "peak": 0}
+        return HeavyTailLLM(responses=["Final Answer: ok"], metadata=shape)
+
+    runs = {
+        "plain": lambda p: p,
+        "retry": lambda p: ResilientLLM(llm=p, label="bench_retry", attempt_timeout=args.timeout, backoff_base=0.05,
+                                        hedge=False, gateway=LLMGateway(max_concurrency=args.concurrency)),
+        "hedge": lambda p: ResilientLLM(llm=p, label="bench_hedge", attempt_timeout=args.timeout, backoff_base=0.05,
+                                        hedge=True, gateway=LLMGateway(max_concurrency=args.concurrency)),
+    }
+    print(f"{args.calls} calls, {args.threads} threads, median {args.median * 1000:.0f} ms, "
+          f"{args.tail_rate:.0%} heavy tail, {args.error_rate:.0%} errors")
+    print(f"{'run':>6} {'ok':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} {'provider calls':>15} {'peak':>5}")
+    for name, wrap in runs.items():
+        base = provider()
+        llm = wrap(base)
+        run(llm, args.warmup, args.threads)
+        before = base.usage()["calls"]
+        latencies, failures = run(llm, args.calls, args.threads)
+        sent = base.usage()["calls"] - before
+        print(f"{name:>6} {1 - failures / args.calls:>6.1%} "
+              + " ".join(f"{1000 * percentile(latencies, q):>7.0f}" for q in (0.5, 0.95, 0.99, 1.0))
+              + f" {sent / args.calls:>14.2f}x {base.metadata['peak']:>5}")
+        if isinstance(llm, ResilientLLM):
+            stats = llm.stats()
+            print(f"{'':>6} retries {stats['retries']}, timeouts {stats['timeouts']}, hedged {stats['hedged']} "
+                  f"(won {stats['hedge_wins']}, skipped {stats['hedges_skipped']}), abandoned {stats['abandoned']}, "
+                  f"hedge delay {stats['hedge_delay_ms'] or 0:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
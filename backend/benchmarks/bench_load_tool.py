@@ -0,0 +1,72 @@
+"""
+Per-request cost of agent.load_tool at 10, 100 and 1000 registry entries.
+
+Compares the old behaviour (exec_module once per registry entry) with the
+module cache. Run from the backend directory:
+
+    python benchmarks/bench_load_tool.py
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent  # noqa: E402
+
+SIZES = [10, 100, 1000]
+REQUESTS = 20
+
+
+def write_fixture(root: str, n: int) -> str:
+    tools_file = os.path.join(root, f"generated_{n}.py")
+    with open(tools_file, "w") as f:
+        for i in range(n):
+            f.write(f"def tool_{i}(input: str) -> float:\n")
+            f.write(f"    return float(input.split(',')[0]) + {i}\n\n")
+    registry_path = os.path.join(root, f"registry_{n}.yaml")
+    with open(registry_path, "w") as f:
+        yaml.dump([{"name": f"tool_{i}", "description": f"tool {i}", "saved_in": tools_file} for i in range(n)], f)
+    return registry_path
+
+
+def load_uncached(registry_path: str):
+    with open(registry_path) as f:
+        registry = yaml.safe_load(f) or []
+    tools = []
+    for entry in registry:
+        spec = importlib.util.spec_from_file_location("bench_tools", entry["saved_in"])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        tools.append(getattr(module, entry["name"]))
+    return tools
+
+
+def per_request_ms(fn, registry_path: str, requests: int = REQUESTS) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn(registry_path)
+    return (time.perf_counter() - start) * 1000 / requests
+
+
+def main():
+    agent.logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory() as root:
+        print(f"{'entries':>8} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8}")
+        for n in SIZES:
+            registry_path = write_fixture(root, n)
+            agent.clear_tool_cache()
+            agent.load_tool(registry_path)  # warm the cache once, as the first request would
+            # The uncached path is quadratic (N entries x N-function module), so sample it less.
+            before = per_request_ms(load_uncached, registry_path, requests=max(1, 200 // n))
+            after = per_request_ms(agent.load_tool, registry_path)
+            print(f"{n:>8} {before:>12.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
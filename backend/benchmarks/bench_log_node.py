@@ -0,0 +1,97 @@
+"""
+Per-node overhead of agent.log_node, before and after lazy queued logging.
+
+"before" is the previous decorator. It serialized the whole state twice per
+node, str()'d every field and wrote the JSON synchronously. "after" is the
+current decorator. It logs a bounded state summary and leaves rendering and I/O
+to the queue listener thread.
+
+Both write to /dev/null. The overhead is time spent on the calling thread (the
+event loop) beyond the bare node. It is reported with DEBUG on (the default)
+and with DEBUG off. Run from the backend directory:
+
+    python benchmarks/bench_log_node.py
+"""
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from functools import wraps
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Give both loggers a /dev/null handler before agent configures its own.
+_devnull = open(os.devnull, "w")
+for name in ("agent", "bench_before"):
+    logging.getLogger(name).addHandler(logging.StreamHandler(_devnull))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+import agent  # noqa: E402
+
+before_logger = logging.getLogger("bench_before")
+ITERATIONS = {10: 2000, 100: 500, 1000: 50}
+
+
+# The decorator as it was before lazy logging.
+def old_log_node(func):
+    @wraps(func)
+    async def wrapper(state, stream_callback=None):
+        log_data = {
+            "node": func.__name__,
+            "input_state": {k: str(v)[:100] for k, v in agent.serialize_agent_state(state).items()},
+            "timestamp": logging.Formatter().formatTime(logging.makeLogRecord({})),
+        }
+        before_logger.debug(json.dumps({"event": "node_entry", **log_data}))
+        result = await func(state, stream_callback)
+        log_data["output_state"] = {k: str(v)[:100] for k, v in agent.serialize_agent_state(result).items()}
+        before_logger.debug(json.dumps({"event": "node_exit", **log_data}))
+        return result
+    return wrapper
+
+
+async def node(state, stream_callback=None):
+    return state
+
+
+def make_state(n: int) -> agent.AgentState:
+    messages = []
+    for i in range(n):
+        cls = HumanMessage if i % 2 == 0 else AIMessage
+        messages.append(cls(content=f"message {i}: " + "lorem ipsum dolor sit amet " * 8, id=str(i)))
+    return agent.AgentState(messages=messages, result="42")
+
+
+async def per_call_us(fn, state, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn(state)
+        samples.append(time.perf_counter() - start)
+    return 1e6 * statistics.median(samples)
+
+
+async def main() -> None:
+    bare = node
+    before = old_log_node(node)
+    after = agent.log_node(node)
+    print(f"{'messages':>8} {'debug':>6} {'bare us':>9} {'before us':>10} {'after us':>9} {'speedup':>8}")
+    for level in (logging.DEBUG, logging.INFO):
+        agent.logger.setLevel(level)
+        before_logger.setLevel(level)
+        for n, iterations in ITERATIONS.items():
+            state = make_state(n)
+            base = await per_call_us(bare, state, iterations)
+            old = await per_call_us(before, state, iterations) - base
+            new = await per_call_us(after, state, iterations) - base
+            print(f"{n:>8} {'on' if level == logging.DEBUG else 'off':>6} {base:>9.2f} {old:>10.1f} {new:>9.1f} "
+                  f"{old / max(new, 0.01):>7.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Prompt size and per-turn latency over a long session, per memory policy.
+
+Replays one conversation of --turns arithmetic questions through the
+testings/test_resoning.py graph with the scripted LLM. Each turn starts from
+the previous turn's final state (messages, summary, memory_start), the way a
+server holding the session would. The scripted LLM's usage counters give the
+prompt tokens actually sent. Every policy is reported with:
+
+- prompt tokens per turn, first and last
+- total prompt tokens, plus the saving against "full"
+- summarization calls
+- p50 wall time per turn, first and last tenth of the session
+
+Run from the backend directory:
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --turns 300 --budget 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+import test_resoning  # noqa: E402
+from fake_llm import scripted  # noqa: E402
+from conversation_memory import memory_stats  # noqa: E402
+
+OPS = "+-*/"
+
+
+def run_session(policy: str, turns: int, budget: int):
+    chat_llm = scripted(test_resoning.llm)
+    summary_llm = scripted(test_resoning.summary_llm)
+    config = {"configurable": {"memory_policy": policy, "memory_token_budget": budget}}
+    state = {"messages": []}
+    per_turn_tokens, per_turn_seconds = [], []
+    summaries_before = summary_llm.usage()["calls"]
+    for t in range(turns):
+        question = f"what is {t + 3} {OPS[t % 4]} {t % 7 + 2}? please show the working for turn {t}."
+        before = chat_llm.usage()["prompt_tokens"]
+        start = time.perf_counter()
+        state = test_resoning.app.invoke({**state, "messages": state["messages"] + [HumanMessage(content=question)]},
+                                         config)
+        per_turn_seconds.append(time.perf_counter() - start)
+        per_turn_tokens.append(chat_llm.usage()["prompt_tokens"] - before)
+    return per_turn_tokens, per_turn_seconds, summary_llm.usage()["calls"] - summaries_before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=150)
+    parser.add_argument("--budget", type=int, default=1500, help="memory token budget")
+    args = parser.parse_args()
+
+    tenth = max(1, args.turns // 10)
+    print(f"{args.turns} turns, budget {args.budget} tokens")
+    print(f"{'policy':>8} {'first tok':>10} {'last tok':>9} {'total tok':>10} {'saved':>7} {'summaries':>10} "
+          f"{'early ms':>9} {'late ms':>8}")
+    baseline = None
+    for policy in ("full", "window", "summary"):
+        tokens, seconds, summaries = run_session(policy, args.turns, args.budget)
+        total = sum(tokens)
+        baseline = baseline or total
+        print(f"{policy:>8} {tokens[0]:>10} {tokens[-1]:>9} {total:>10} {1 - total / baseline:>6.0%} {summaries:>10} "
+              f"{1000 * statistics.median(seconds[:tenth]):>9.2f} {1000 * statistics.median(seconds[-tenth:]):>8.2f}")
+    print(f"memory_stats: {memory_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+End-to-end latency of sequential against parallel tool calling in testings/test_resoning.py.
+
+A scripted stand-in LLM answers each multi-part query the way each prompt
+asks it to. In sequential mode it makes one tool call per turn. In parallel
+mode it puts every call in one JSON block. Each LLM call sleeps for
+--latency seconds. Run from the backend directory:
+
+    python benchmarks/bench_parallel_tools.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+import test_resoning  # noqa: E402
+from fake_llm import ScriptedLLM  # noqa: E402
+
+# (query, [(tool, input), ...]) -- every part is independent of the others.
+QUERIES = [
+    ("what is 5325232+32423, then 2323*32, then 1231-3232?",
+     [("addition", "5325232,32423"), ("multiplication", "2323,32"), ("subtraction", "1231,3232")]),
+    ("find 23424+2322, 1231-3232, 2323*32 and 32323/32",
+     [("addition", "23424,2322"), ("subtraction", "1231,3232"), ("multiplication", "2323,32"), ("division", "32323,32")]),
+    ("what is 6*7 and 10/4?",
+     [("multiplication", "6,7"), ("division", "10,4")]),
+]
+
+
+def tool_block(calls):
+    payload = [{"name": name, "args": {"input": arg}, "id": f"call_{i}"} for i, (name, arg) in calls]
+    return f"Using tools.\n```json\n{json.dumps(payload)}\n```"
+
+
+def script(calls, mode):
+    numbered = list(enumerate(calls))
+    if mode == "parallel":
+        turns = [tool_block(numbered)]
+    else:
+        turns = [tool_block([c]) for c in numbered]
+    return turns + ["Here are all the answers."]
+
+
+def run(query, calls, mode, latency):
+    test_resoning.llm = ScriptedLLM(responses=script(calls, mode), latency=latency)
+    start = time.perf_counter()
+    result = test_resoning.app.invoke(
+        {"messages": [HumanMessage(content=query)]},
+        config={"configurable": {"tool_call_mode": mode}},
+    )
+    elapsed = time.perf_counter() - start
+    tool_results = [m for m in result["messages"] if m.type == "tool"]
+    assert len(tool_results) == len(calls), f"{mode}: expected {len(calls)} tool results"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"llm latency per call: {args.latency:.2f} s")
+    print(f"{'tools':>5} {'sequential s':>13} {'parallel s':>11} {'speedup':>8}")
+    totals = {"sequential": [], "parallel": []}
+    for query, calls in QUERIES:
+        seq = run(query, calls, "sequential", args.latency)
+        par = run(query, calls, "parallel", args.latency)
+        totals["sequential"].append(seq)
+        totals["parallel"].append(par)
+        print(f"{len(calls):>5} {seq:>13.2f} {par:>11.2f} {seq / par:>7.1f}x")
+    print(f"{'mean':>5} {statistics.mean(totals['sequential']):>13.2f} {statistics.mean(totals['parallel']):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+CPU time spent assembling prompts per request, before and after PromptBuilder.
+
+Two pieces are measured:
+
+- The tool-call system prompt of testings/test_resoning.py. "before" runs
+  generate_tool_prompt and the f-string on every agent-loop turn. "after"
+  looks the prompt up in the builder.
+- agent.load_system_prompt. "before" opens and parses system_prompt.yaml on
+  every call. "after" only stats the file.
+
+A request is --turns agent-loop turns (one LLM call each) plus one system
+prompt load. Run from the backend directory:
+
+    python benchmarks/bench_prompt_builder.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("TOOL_EMBEDDINGS", "local")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "testings"))
+os.chdir(BACKEND)
+
+import test_resoning  # noqa: E402
+from prompt_builder import load_prompt_file, tools_fingerprint  # noqa: E402
+
+
+def old_load_system_prompt(path: str = "system_prompt.yaml") -> str:
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    with open(path) as f:
+        return yaml.safe_load(f).get("system_prompt", "")
+
+
+def before_request(turns: int, mode: str) -> None:
+    old_load_system_prompt()
+    for _ in range(turns):
+        test_resoning.render_system_prompt(test_resoning.tools, mode)
+
+
+def after_request(turns: int, mode: str) -> None:
+    load_prompt_file("system_prompt.yaml")
+    for _ in range(turns):
+        test_resoning.system_prompts.get((tools_fingerprint(test_resoning.tools), mode), test_resoning.tools, mode)
+
+
+def cpu_us_per_request(fn, turns: int, mode: str, requests: int) -> float:
+    fn(turns, mode)  # warm up
+    start = time.process_time()
+    for _ in range(requests):
+        fn(turns, mode)
+    return 1e6 * (time.process_time() - start) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"{'turns':>5} {'mode':>10} {'before us':>10} {'after us':>9} {'saved us':>9} {'speedup':>8}")
+    for turns in (1, 3, 6):
+        for mode in ("sequential", "parallel"):
+            before = cpu_us_per_request(before_request, turns, mode, args.requests)
+            after = cpu_us_per_request(after_request, turns, mode, args.requests)
+            print(f"{turns:>5} {mode:>10} {before:>10.1f} {after:>9.1f} {before - after:>9.1f} {before / after:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
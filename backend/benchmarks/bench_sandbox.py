@@ -0,0 +1,100 @@
+"""
+Cost and benefit of running generated tools in the sandbox pool.
+
+Three measurements:
+
+- per-call overhead: a trivial tool called in-process and through the pool
+  (one pipe round trip each way)
+- CPU-bound throughput: --calls calls of a tool that burns about 20 ms of
+  CPU, issued from --workers threads. In-process they share the GIL; in the
+  pool they run on separate cores.
+- isolation: an infinite loop is stopped by the CPU limit, and a call right
+  after it still succeeds
+
+Run from the backend directory:
+
+    python benchmarks/bench_sandbox.py --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox import SandboxError, SandboxPool, _load_module  # noqa: E402
+
+TOOLS = '''
+from langchain_core.tools import tool
+
+@tool
+def add_numbers(input: str) -> float:
+    """Adds two numbers. Input: 'a,b'"""
+    return float(input.split(',')[0]) + float(input.split(',')[1])
+
+@tool
+def burn_cpu(input: str) -> float:
+    """Sums squares up to n. Input: 'n'"""
+    return float(sum(i * i for i in range(int(input))))
+
+@tool
+def spin_forever(input: str) -> float:
+    """Never returns."""
+    while True:
+        pass
+'''
+
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return 1e6 * (time.perf_counter() - start) / calls
+
+
+def throughput(fn, calls: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as threads:
+        list(threads.map(lambda _: fn(), range(calls)))
+    return calls / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--calls", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_generated_tools.py")
+        with open(path, "w") as f:
+            f.write(TOOLS)
+        local = _load_module(path, {})
+        start = time.perf_counter()
+        pool = SandboxPool(size=args.workers, preload=[path], timeout=5, cpu_seconds=1)
+        print(f"pool of {args.workers} started in {time.perf_counter() - start:.2f}s")
+        pool.call(path, "add_numbers", ("1,2",))  # wait until the workers are up
+
+        inproc = per_call_us(lambda: local.add_numbers.func("1,2"), 2000)
+        sandboxed = per_call_us(lambda: pool.call(path, "add_numbers", ("1,2",)), 2000)
+        print(f"trivial tool: in-process {inproc:.1f} us/call, sandbox {sandboxed:.1f} us/call")
+
+        n = "300000"
+        inproc = throughput(lambda: local.burn_cpu.func(n), args.calls, args.workers)
+        sandboxed = throughput(lambda: pool.call(path, "burn_cpu", (n,)), args.calls, args.workers)
+        print(f"cpu-bound tool, {args.workers} threads: in-process {inproc:.1f} calls/s, sandbox {sandboxed:.1f} calls/s")
+
+        start = time.perf_counter()
+        try:
+            pool.call(path, "spin_forever", ("",))
+        except SandboxError as e:
+            print(f"runaway tool stopped after {time.perf_counter() - start:.2f}s: {e}")
+        print(f"next call: {pool.call(path, 'add_numbers', ('2,3',))}")
+        print(pool.stats())
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
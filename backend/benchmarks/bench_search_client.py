@@ -0,0 +1,103 @@
+"""
+search_client.SearchClient against a local stand-in search server that injects latency.
+
+Checks three things, with no network access needed:
+  1. 20 concurrent identical queries are coalesced into a single fetch.
+  2. A hung backend is cut off at the client timeout.
+  3. Pooled keep-alive connections against a fresh connection per call.
+Run from the backend directory:
+
+    python benchmarks/bench_search_client.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_client import HTTPJSONBackend, SearchClient, SearchTimeout  # noqa: E402
+
+LATENCY = 0.2
+HANG = 5.0
+
+
+class StandInSearch(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+    disable_nagle_algorithm = True
+    hits = 0
+
+    def do_GET(self):
+        StandInSearch.hits += 1
+        params = parse_qs(urlsplit(self.path).query)
+        query = params["q"][0]
+        limit = int(params.get("max_results", ["10"])[0])
+        time.sleep(HANG if query.startswith("hang") else LATENCY)
+        body = json.dumps([{"body": f"result {i} for {query}"} for i in range(limit)]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def coalescing(url: str) -> None:
+    client = SearchClient(HTTPJSONBackend(url), timeout=2.0)
+    StandInSearch.hits = 0
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.asearch("president of Sri Lanka") for _ in range(20)))
+    elapsed = time.perf_counter() - start
+    assert len(set(results)) == 1
+    print(f"coalescing: 20 callers -> {StandInSearch.hits} backend fetch(es) in {elapsed:.2f} s; stats {client.stats()}")
+
+
+async def timeout(url: str) -> None:
+    client = SearchClient(HTTPJSONBackend(url, timeout=HANG + 1), timeout=0.5)
+    start = time.perf_counter()
+    try:
+        await client.asearch("hang forever")
+        outcome = "no timeout (unexpected)"
+    except SearchTimeout as e:
+        outcome = str(e)
+    print(f"timeout:    gave up after {time.perf_counter() - start:.2f} s ({outcome})")
+
+
+def pooling(url: str) -> None:
+    rounds = 20
+    pooled = HTTPJSONBackend(url)
+    start = time.perf_counter()
+    for i in range(rounds):
+        pooled.search(f"pooled {i}", 3)
+    pooled_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        HTTPJSONBackend(url).search(f"fresh {i}", 3)
+    fresh_s = time.perf_counter() - start
+    overhead_ms = (fresh_s - pooled_s) * 1000 / rounds
+    print(f"pooling:    {rounds} sequential searches pooled {pooled_s:.2f} s, fresh connections {fresh_s:.2f} s "
+          f"({overhead_ms:.2f} ms connect overhead per call)")
+
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSearch)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/search"
+    try:
+        asyncio.run(coalescing(url))
+        asyncio.run(timeout(url))
+        pooling(url)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
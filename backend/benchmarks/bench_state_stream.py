@@ -0,0 +1,80 @@
+"""
+Bytes on the wire and serialization CPU per conversation: full state snapshots
+against StateStream deltas.
+
+A conversation of T turns is replayed step by step, the way agent.run_agent
+sees it. Each turn emits three graph steps:
+
+1. input: the human message is appended
+2. load_use_tool: the AI answer is appended and `result` is set
+3. final: nothing changes
+
+"before" sends the whole serialized state on every step, encoded with json.
+"after" sends a snapshot once, then deltas, encoded with encode_frame (orjson
+when installed). Run from the backend directory:
+
+    python benchmarks/bench_state_stream.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from state_stream import StateStream, encode_frame, orjson, serialize_message  # noqa: E402
+
+FIELDS = ("tool_needed", "tool_found", "tool_lookup_result", "tool_gen_result", "result")
+
+
+def conversation_states(turns: int):
+    messages = []
+    result = None
+    for t in range(turns):
+        messages = messages + [HumanMessage(content=f"question {t}: what is {t} + {t * 7}? " + "context " * 20, id=f"h{t}")]
+        yield {"messages": messages, **{f: None for f in FIELDS}, "result": result}
+        answer = f"The answer to question {t} is {t * 8}. " + "explanation " * 30
+        messages = messages + [AIMessage(content=answer, id=f"a{t}")]
+        result = answer
+        yield {"messages": messages, **{f: None for f in FIELDS}, "result": result}
+        yield {"messages": messages, **{f: None for f in FIELDS}, "result": result}
+
+
+def full_snapshots(turns: int):
+    total = 0
+    for state in conversation_states(turns):
+        frame = {"event": "state_update", "state": {**state, "messages": [serialize_message(m) for m in state["messages"]]}}
+        total += len(json.dumps(frame, default=str).encode())
+    return total
+
+
+def deltas(turns: int):
+    stream = StateStream("delta")
+    total = 0
+    for state in conversation_states(turns):
+        frame = stream.frame(state)
+        if frame is not None:
+            total += len(encode_frame(frame))
+    return total
+
+
+def timed(fn, turns: int):
+    start = time.perf_counter()
+    size = fn(turns)
+    return size, time.perf_counter() - start
+
+
+def main() -> None:
+    print(f"serializer: {'orjson' if orjson else 'json'} (deltas), json (snapshots)")
+    print(f"{'turns':>6} {'full KB':>10} {'delta KB':>9} {'ratio':>7} {'full ms':>9} {'delta ms':>9}")
+    for turns in (10, 50, 200):
+        full_bytes, full_s = timed(full_snapshots, turns)
+        delta_bytes, delta_s = timed(deltas, turns)
+        print(f"{turns:>6} {full_bytes / 1024:>10.1f} {delta_bytes / 1024:>9.1f} {full_bytes / delta_bytes:>6.0f}x "
+              f"{full_s * 1000:>9.1f} {delta_s * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Tool-description prompt size with per-query selection on and off.
+
+Builds registries of 10, 100 and 1000 synthetic tools (plus the checked-in
+registry) and reports the characters of tool names and descriptions sent to
+the agent for a set of sample queries. It uses the same hybrid_search ranking
+as agent.select_tools and is offline. Run from the backend directory:
+
+    python benchmarks/bench_tool_selection.py
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry_store import ToolRegistryStore  # noqa: E402
+from tool_search import hybrid_search  # noqa: E402
+import tool_search  # noqa: E402
+
+TOP_K = 5
+QUERIES = [
+    "what is 339 divided by 77?",
+    "add 4.5 and 10",
+    "who is the president of Sri Lanka?",
+    "convert 30 celsius to fahrenheit",
+    "subtract 423 from 888",
+]
+VERBS = ["add", "subtract", "multiply", "divide", "convert", "compute", "parse", "format", "sort", "search"]
+NOUNS = ["numbers", "matrix", "temperature", "currency", "date", "string", "polynomial", "vector", "list", "angle"]
+
+
+def prompt_chars(entries):
+    return sum(len(e["name"]) + len(e.get("description", "")) for e in entries)
+
+
+def report(label, registry):
+    entries = registry.entries()
+    full = prompt_chars(entries)
+    selected = sum(prompt_chars(hybrid_search(registry, q, limit=TOP_K)) for q in QUERIES) / len(QUERIES)
+    print(f"{label:>12} {len(entries):>7} {full:>12} {selected:>14.0f} {1 - selected / full:>8.1%}")
+
+
+def main():
+    root = tempfile.mkdtemp()
+    tool_search.EMBEDDINGS_PATH = os.path.join(root, "embeddings.npz")
+    try:
+        print(f"{'registry':>12} {'tools':>7} {'chars (off)':>12} {'chars (on)':>14} {'saved':>8}")
+        shutil.copy("tools/tool_registry.yaml", root)
+        report("checked-in", ToolRegistryStore(os.path.join(root, "repo.jsonl"), os.path.join(root, "tool_registry.yaml")))
+        rng = random.Random(0)
+        for n in (10, 100, 1000):
+            entries = []
+            for i in range(n):
+                verb, noun = rng.choice(VERBS), rng.choice(NOUNS)
+                entries.append({"name": f"{verb}_{noun}_{i}", "description": f"{verb.capitalize()}s {noun}. Input: 'a,b'"})
+            yaml_path = os.path.join(root, f"synthetic_{n}.yaml")
+            with open(yaml_path, "w") as f:
+                yaml.dump(entries, f)
+            report("synthetic", ToolRegistryStore(os.path.join(root, f"synthetic_{n}.jsonl"), yaml_path))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,245 @@
-import requests
-import websockets
+"""
+Load generator for the REST (/api/query) and WebSocket (/ws/query) endpoints.
+
+Closed loop: --users virtual users each send a query, wait for the final
+answer, pause --think-time seconds and go again.
+Open loop: queries arrive as a Poisson process at --rate per second,
+regardless of how quickly earlier ones finish.
+
+Queries are drawn from --corpus. The file has one query per line, or one JSON
+object with a "query" field per line.
+
+For every request it records:
+- time to first event: the first WebSocket message, or the REST response headers
+- time to final answer: the last "ai" message before "end", or the full REST body
+- errors
+
+    python client.py --mode ws --users 8 --duration 30
+    python client.py --mode rest --rate 5 --requests 200 --corpus queries.txt --json report.json
+"""
+import argparse
 import asyncio
 import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+import websockets
+
+DEFAULT_QUERIES = [
+    "Who is president of srilaka?",
+    "Who is Olivia Wilde's boyfriend?",
+    "what is 5325232+32423?",
+    "divide 32323 by 32",
+]
+
+
+def load_corpus(path: Optional[str]) -> List[str]:
+    if not path:
+        return list(DEFAULT_QUERIES)
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["query"]
+            queries.append(line)
+    if not queries:
+        raise ValueError(f"No queries in {path}")
+    return queries
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# One keep-alive session per worker thread, so REST users reuse connections.
+_sessions = threading.local()
+
+def _session() -> requests.Session:
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def _rest_request(base_url: str, query: str, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    response = _session().post(f"{base_url}/api/query", json={"query": query}, timeout=timeout, stream=True)
+    first = time.perf_counter() - start
+    body = response.content
+    final = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {body[:200]!r}")
+    return {"ttfe": first, "ttfa": final, "events": 1}
+
 
-# Test REST endpoint
-def test_rest_endpoint(query: str):
-    url = "http://localhost:8000/api/query"
-    payload = {"query": query}
-    response = requests.post(url, json=payload)
-    print(f"REST Response: {response.json()}")
+async def rest_request(base_url: str, query: str, timeout: float) -> Dict[str, Any]:
+    return await asyncio.to_thread(_rest_request, base_url, query, timeout)
 
-# Test WebSocket endpoint
-async def test_websocket_endpoint(query: str):
-    async with websockets.connect("ws://localhost:8000/ws/query") as websocket:
+
+async def _ws_exchange(ws_url: str, query: str, verbose: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first = final = None
+    events = 0
+    async with websockets.connect(ws_url, max_size=None) as websocket:
         await websocket.send(query)
-        while True:
-            message = await websocket.recv()
-            print(f"WebSocket Message: {json.loads(message)}")
+        async for raw in websocket:
+            now = time.perf_counter() - start
+            message = json.loads(raw)
+            events += 1
+            if first is None:
+                first = now
+            if verbose:
+                print(f"  [{now * 1000:8.1f} ms] {message}")
+            if message.get("type") == "ai":
+                final = now
+            elif message.get("type") == "error":
+                raise RuntimeError(message.get("detail", "error event"))
+            elif message.get("type") == "end":
+                break
+    if final is None:
+        raise RuntimeError("stream ended without an answer")
+    return {"ttfe": first, "ttfa": final, "events": events}
+
+
+async def ws_request(base_url: str, query: str, timeout: float, verbose: bool = False) -> Dict[str, Any]:
+    ws_url = base_url.replace("http://", "ws://", 1).replace("https://", "wss://", 1) + "/ws/query"
+    return await asyncio.wait_for(_ws_exchange(ws_url, query, verbose), timeout)
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.queries = load_corpus(args.corpus)
+        self.rng = random.Random(args.seed)
+        self.results: List[Dict[str, Any]] = []
+        self.errors: Dict[str, int] = {}
+        self.inflight = asyncio.Semaphore(args.max_inflight)
+        self.sent = 0
+
+    def _next_query(self) -> str:
+        return self.rng.choice(self.queries)
+
+    def _more(self, deadline: float) -> bool:
+        if self.args.requests and self.sent >= self.args.requests:
+            return False
+        return time.perf_counter() < deadline
+
+    async def one(self, query: str) -> None:
+        started = time.perf_counter()
+        try:
+            if self.args.mode == "ws":
+                result = await ws_request(self.args.url, query, self.args.timeout, self.args.verbose)
+            else:
+                result = await rest_request(self.args.url, query, self.args.timeout)
+            result["ok"] = True
+        except Exception as e:
+            kind = type(e).__name__ if not str(e) else f"{type(e).__name__}: {str(e)[:80]}"
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+            result = {"ok": False, "ttfa": time.perf_counter() - started}
+        self.results.append(result)
+
+    async def closed_loop(self, deadline: float) -> None:
+        async def user() -> None:
+            while self._more(deadline):
+                self.sent += 1
+                await self.one(self._next_query())
+                if self.args.think_time:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+        await asyncio.gather(*(user() for _ in range(self.args.users)))
+
+    async def open_loop(self, deadline: float) -> None:
+        tasks = []
+
+        async def bounded(query: str) -> None:
+            async with self.inflight:
+                await self.one(query)
+
+        while self._more(deadline):
+            self.sent += 1
+            tasks.append(asyncio.create_task(bounded(self._next_query())))
+            await asyncio.sleep(self.rng.expovariate(self.args.rate))
+        await asyncio.gather(*tasks)
+
+    async def run(self) -> Dict[str, Any]:
+        # REST calls are blocking; give every possible in-flight request a thread
+        # so the client, not the default executor size, is never the bottleneck.
+        workers = self.args.max_inflight if self.args.rate else self.args.users
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(1, workers)))
+        start = time.perf_counter()
+        deadline = start + self.args.duration if self.args.duration else math.inf
+        if self.args.rate:
+            await self.open_loop(deadline)
+        else:
+            await self.closed_loop(deadline)
+        return self.report(time.perf_counter() - start)
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        ok = [r for r in self.results if r["ok"]]
+
+        def summary(key: str) -> Dict[str, Optional[float]]:
+            values = [1000 * r[key] for r in ok]
+            row = {f"p{p}": percentile(values, p) for p in (50, 90, 95, 99)}
+            row["max"] = max(values, default=None)
+            return row
+
+        total = len(self.results)
+        return {
+            "mode": self.args.mode,
+            "arrival": f"open {self.args.rate}/s" if self.args.rate else f"closed {self.args.users} users",
+            "requests": total,
+            "errors": total - len(ok),
+            "error_rate": (total - len(ok)) / total if total else 0.0,
+            "error_kinds": self.errors,
+            "wall_s": wall,
+            "throughput_rps": len(ok) / wall if wall else 0.0,
+            "time_to_first_event_ms": summary("ttfe"),
+            "time_to_final_answer_ms": summary("ttfa"),
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['mode']} / {report['arrival']}: {report['requests']} requests in {report['wall_s']:.1f} s, "
+          f"{report['throughput_rps']:.2f} answers/s, error rate {report['error_rate']:.1%}")
+    print(f"{'':24}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for label, key in (("time to first event ms", "time_to_first_event_ms"), ("time to answer ms", "time_to_final_answer_ms")):
+        row = report[key]
+        cells = "".join(f"{row[k]:>9.1f}" if row[k] is not None else f"{'-':>9}" for k in ("p50", "p90", "p95", "p99", "max"))
+        print(f"{label:<24}{cells}")
+    for kind, count in report["error_kinds"].items():
+        print(f"  {count} x {kind}")
+
 
-# Run tests
 if __name__ == "__main__":
-    # Test REST
-    # test_rest_endpoint("Who is president of srilaka?")
-    
-    # # Test WebSocket
-    asyncio.run(test_websocket_endpoint("Who is Olivia Wilde's boyfriend?"))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load generator for the agent API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--mode", choices=["ws", "rest"], default="ws")
+    parser.add_argument("--users", type=int, default=1, help="closed loop: concurrent virtual users")
+    parser.add_argument("--rate", type=float, default=0.0, help="open loop: mean arrivals per second")
+    parser.add_argument("--max-inflight", type=int, default=256, help="open loop: cap on outstanding requests")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no limit)")
+    parser.add_argument("--duration", type=float, default=0.0, help="stop sending after this many seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="closed loop: mean pause between requests")
+    parser.add_argument("--corpus", help="query file, one query (or JSON object) per line")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="print every WebSocket event")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        args.requests = args.users
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
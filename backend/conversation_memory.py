@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage, get_buffer_string
+
+from log_utils import log_event
+
+logger = logging.getLogger("agent")
+
+# MEMORY_POLICY decides how much history goes into each LLM prompt:
+#   full    - every message (the old behaviour)
+#   window  - the newest messages that fit in MEMORY_TOKEN_BUDGET
+#   summary - the window plus a rolling summary of everything before it
+# When the window overflows it is trimmed down to MEMORY_LOW_WATER of the
+# budget, so the start of the window (and the prompt prefix) only moves every
+# few turns and the summary is only recomputed then.
+MEMORY_POLICY = os.getenv("MEMORY_POLICY", "window").lower()
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "4000"))
+MEMORY_LOW_WATER = float(os.getenv("MEMORY_LOW_WATER", "0.5"))
+MEMORY_SUMMARY_WORDS = int(os.getenv("MEMORY_SUMMARY_WORDS", "150"))
+MEMORY_TOOL_RESULT_CHARS = int(os.getenv("MEMORY_TOOL_RESULT_CHARS", "200"))
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the conversation below, adding onto the current summary. "
+    "Keep every number, tool result and open question the assistant may need later. "
+    "Answer with the new summary only, in at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New lines of conversation:\n{lines}\n\n"
+    "New summary:"
+)
+
+
+# Same four-characters-per-token estimate as the scripted LLM. Exact counts
+# would need a provider round trip per message, which is what we are saving.
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    tokens = estimate_tokens(content) + 4  # role prefix and separators
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += estimate_tokens(json.dumps(message.tool_calls, default=str))
+    return tokens
+
+
+# Start index of every unit that may begin a window. An AI message with tool
+# calls and the tool results answering it form one unit, so a window never
+# opens on an orphaned ToolMessage nor ends on a call without its result.
+def unit_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    starts = []
+    for i, message in enumerate(messages):
+        if not isinstance(message, ToolMessage) or not starts:
+            starts.append(i)
+    return starts
+
+
+# Index of the latest human message: the window never starts after it, so the
+# model never loses the question it is answering. A current turn that is over
+# the budget on its own is shortened by compact_turn instead.
+def current_turn_start(messages: Sequence[BaseMessage]) -> int:
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+    return 0
+
+
+# Where the window should start, given where it started last turn. The old
+# start is kept while the window fits the budget; otherwise whole units are
+# taken from the end until the low-water mark.
+def window_start(messages: Sequence[BaseMessage], previous: int, budget: int,
+                 low_water: float = MEMORY_LOW_WATER) -> int:
+    if not messages:
+        return 0
+    starts = unit_starts(messages)
+    pinned = current_turn_start(messages)
+    previous = min(next((s for s in starts if s >= previous), pinned), pinned)
+    costs = [message_tokens(m) for m in messages]
+    if sum(costs[previous:]) <= budget:
+        return previous
+    target = budget * low_water
+    start = pinned
+    used = sum(costs[pinned:])
+    for candidate in reversed([s for s in starts if s < pinned]):
+        extra = sum(costs[candidate:start])
+        if used + extra > target:
+            break
+        start, used = candidate, used + extra
+    return max(start, previous)
+
+
+# An older step of the current turn, shortened: an AI message keeps its tool
+# calls but not its text, a tool result keeps its first
+# MEMORY_TOOL_RESULT_CHARS characters.
+def compact_message(message: BaseMessage) -> BaseMessage:
+    if isinstance(message, AIMessage) and message.tool_calls and message.content:
+        return message.model_copy(update={"content": ""})
+    if (isinstance(message, ToolMessage) and isinstance(message.content, str)
+            and len(message.content) > MEMORY_TOOL_RESULT_CHARS):
+        return message.model_copy(update={"content": message.content[:MEMORY_TOOL_RESULT_CHARS] + " ..."})
+    return message
+
+
+# The served graph has no checkpointer, so every request is a single turn and
+# the window alone never trims it. When the context is over the budget, the
+# steps of the current turn are compacted oldest first until it fits. Every
+# call and result stays in place, so the model still sees how far it got; the
+# newest step is sent whole. Returns the context and how many messages were
+# compacted.
+def compact_turn(context: List[BaseMessage], budget: int) -> Tuple[List[BaseMessage], int]:
+    costs = [message_tokens(m) for m in context]
+    used = sum(costs)
+    steps = [s for s in unit_starts(context) if s > current_turn_start(context)]
+    if used <= budget or len(steps) < 2:
+        return context, 0
+    context = list(context)
+    compacted = 0
+    for i in range(steps[0], steps[-1]):
+        message = compact_message(context[i])
+        if message is context[i]:
+            continue
+        context[i] = message
+        used += message_tokens(message) - costs[i]
+        compacted += 1
+        if used <= budget:
+            break
+    return context, compacted
+
+
+def summarize(llm: BaseLanguageModel, summary: str, messages: Sequence[BaseMessage]) -> str:
+    prompt = SUMMARY_PROMPT.format(words=MEMORY_SUMMARY_WORDS, summary=summary or "(empty)",
+                                   lines=get_buffer_string(messages))
+    # No callbacks: summary tokens are bookkeeping, not part of the answer
+    # streamed to the client.
+    result = llm.invoke(prompt, config={"callbacks": [], "run_name": "memory_summary"})
+    return (result.content if isinstance(result, BaseMessage) else str(result)).strip()
+
+
+# Totals since start-up, exposed through /api/metrics.
+class MemoryStats:
+    def __init__(self):
+        self.calls = 0
+        self.summaries = 0
+        self.history_tokens = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, history_tokens: int, prompt_tokens: int, summarized: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.summaries += int(summarized)
+            self.history_tokens += history_tokens
+            self.prompt_tokens += prompt_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.history_tokens - self.prompt_tokens
+            return {
+                "policy": MEMORY_POLICY,
+                "token_budget": MEMORY_TOKEN_BUDGET,
+                "calls": self.calls,
+                "summaries": self.summaries,
+                "history_tokens": self.history_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": saved / self.history_tokens if self.history_tokens else 0.0,
+            }
+
+
+_stats = MemoryStats()
+
+def memory_stats() -> Dict[str, Any]:
+    return _stats.stats()
+
+
+# History to send for this turn plus the state fields to write back.
+# `summary` and `memory_start` live in the graph state next to `messages`;
+# the summary only ever absorbs messages[old start:new start], so each turn
+# pays for at most one short summarization call.
+def build_context(messages: Sequence[BaseMessage], summary: str = "", start: int = 0,
+                  llm: Optional[BaseLanguageModel] = None, policy: str = MEMORY_POLICY,
+                  budget: int = MEMORY_TOKEN_BUDGET) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+    messages = list(messages)
+    history_tokens = sum(message_tokens(m) for m in messages)
+    if policy not in ("window", "summary"):
+        _stats.record(history_tokens, history_tokens, False)
+        return messages, {}
+    if start > len(messages):  # history was replaced: start over
+        start, summary = 0, ""
+    new_start = window_start(messages, start, budget)
+    summarized = False
+    if policy == "summary" and llm is not None and new_start > start:
+        summary = summarize(llm, summary, messages[start:new_start])
+        summarized = True
+    context, compacted = compact_turn(messages[new_start:], budget)
+    if policy == "summary" and summary:
+        context.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    prompt_tokens = sum(message_tokens(m) for m in context)
+    _stats.record(history_tokens, prompt_tokens, summarized)
+    log_event(logger, logging.DEBUG, "memory_window", policy=policy, messages=len(messages),
+              window_start=new_start, history_tokens=history_tokens, prompt_tokens=prompt_tokens,
+              saved_tokens=history_tokens - prompt_tokens, summarized=summarized, compacted=compacted)
+    update: Dict[str, Any] = {"memory_start": new_start}
+    if policy == "summary":
+        update["summary"] = summary
+    return context, update
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import Field, PrivateAttr
+
+# Offline stand-in for the Gemini LLM, selected with LLM_PROVIDER=fake. Latency
+# is FAKE_LLM_LATENCY seconds per call plus FAKE_LLM_TOKEN_LATENCY per output
+# token, so benchmarks can model both slow first tokens and long answers.
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.05"))
+FAKE_LLM_TOKEN_LATENCY = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0"))
+
+_EXPRESSION_RE = re.compile(r"(-?\d+(?:\.\d+)?)\s*([-+*/x])\s*(-?\d+(?:\.\d+)?)")
+
+# Tool-name stems per operator. Both graphs list tools as "name: ..." (agent.py
+# ReAct prompt) or "name(input: str)" (testings/test_resoning.py), so the first
+# listed tool whose name contains the stem is the one to call.
+_OPERATOR_STEMS = {"+": "add", "-": "subtract", "*": "multipl", "x": "multipl", "/": "divi"}
+
+
+# Rough token count (about four characters per token) for usage reporting.
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _expressions(text: str) -> List[tuple]:
+    return [(a, op, b) for a, op, b in _EXPRESSION_RE.findall(text)]
+
+
+def _tool_for(op: str, prompt: str) -> Optional[str]:
+    match = re.search(rf"\b(\w*{_OPERATOR_STEMS[op]}\w*)(?::|\(input)", prompt)
+    return match.group(1) if match else None
+
+
+# Replays the ReAct protocol of agent.py's CHAT_ZERO_SHOT_REACT_DESCRIPTION
+# executor: one JSON-blob action for the first arithmetic expression in the
+# question, then a final answer quoting the observation.
+def react_script(prompt: str) -> str:
+    if "This was your previous work" in prompt:
+        observations = re.findall(r"Observation: (.*)", prompt.split("This was your previous work", 1)[1])
+        answer = observations[-1].strip() if observations else "done"
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+    question = prompt.rsplit("Begin!", 1)[-1]
+    for a, op, b in _expressions(question):
+        name = _tool_for(op, prompt)
+        if name:
+            blob = json.dumps({"action": name, "action_input": f"{a},{b}"})
+            return f"Thought: I should use {name}.\nAction:\n```\n{blob}\n```"
+    return "Thought: No tool is needed.\nFinal Answer: I can answer that without tools."
+
+
+# Replays the JSON tool-call protocol of testings/test_resoning.py. Calls are
+# issued for each arithmetic expression in the latest user message that has no
+# tool result yet: all at once when the prompt asks for parallel calls, one per
+# turn otherwise. Once every expression has a result it answers in prose.
+def tool_call_script(prompt: str) -> str:
+    turn = prompt.rsplit("\nHuman: ", 1)[-1]
+    expressions = _expressions(turn.split("\nAI: ", 1)[0])
+    done = len(re.findall(r"^Tool: ", turn, re.MULTILINE))
+    pending = [(i, e) for i, e in enumerate(expressions) if i >= done and _tool_for(e[1], prompt)]
+    if not pending:
+        results = re.findall(r"^Tool: (.*)", turn, re.MULTILINE)
+        return f"The answer is {', '.join(results)}." if results else "I can answer that without tools."
+    if "request all the tools you need at once" not in prompt:
+        pending = pending[:1]
+    calls = [
+        {"name": _tool_for(op, prompt), "args": {"input": f"{a},{b}"}, "id": f"call_{i}"}
+        for i, (a, op, b) in pending
+    ]
+    return f"I will use tools for this.\n```json\n{json.dumps(calls)}\n```"
+
+
+# Answers conversation_memory's summarization prompt: keeps the previous
+# summary and appends the questions and tool results of the new lines.
+def summary_script(prompt: str) -> str:
+    summary = re.search(r"Current summary:\n(.*?)\n\nNew lines", prompt, re.DOTALL)
+    previous = summary.group(1) if summary and summary.group(1) != "(empty)" else ""
+    lines = prompt.split("New lines of conversation:\n", 1)[-1]
+    facts = [line[:120] for line in re.findall(r"^(?:Human|Tool): (.*)", lines, re.MULTILINE)]
+    return " ".join([previous] + facts).strip()[-2000:]
+
+
+# Deterministic scripted LLM. Answers come from `script(prompt)` when given,
+# else cycle through `responses`. Usage counters are shared across threads so
+# a benchmark can read total calls and tokens afterwards.
+class ScriptedLLM(LLM):
+    script: Optional[Callable[[str], str]] = None
+    responses: List[str] = Field(default_factory=list)
+    latency: float = FAKE_LLM_LATENCY
+    token_latency: float = FAKE_LLM_TOKEN_LATENCY
+    model: str = "scripted"
+    temperature: float = 0.0
+
+    _index: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _usage: Dict[str, int] = PrivateAttr(default_factory=lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _respond(self, prompt: str) -> str:
+        if self.script is not None:
+            text = self.script(prompt)
+        elif self.responses:
+            with self._lock:
+                text = self.responses[self._index % len(self.responses)]
+                self._index += 1
+        else:
+            text = "Final Answer: ok"
+        with self._lock:
+            self._usage["calls"] += 1
+            self._usage["prompt_tokens"] += count_tokens(prompt)
+            self._usage["completion_tokens"] += count_tokens(text)
+        return text
+
+    def _delay(self, text: str) -> float:
+        return self.latency + self.token_latency * count_tokens(text)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        text = self._respond(prompt)
+        time.sleep(self._delay(text))
+        return text
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        text = self._respond(prompt)
+        await asyncio.sleep(self._delay(text))
+        return text
+
+    # Streams the answer in whitespace-delimited chunks: `latency` before the
+    # first chunk, then token_latency per chunk's worth of tokens.
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        text = self._respond(prompt)
+        time.sleep(self.latency)
+        for piece in re.findall(r"\S+\s*|\s+", text):
+            time.sleep(self.token_latency * count_tokens(piece))
+            chunk = GenerationChunk(text=piece)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        text = self._respond(prompt)
+        await asyncio.sleep(self.latency)
+        for piece in re.findall(r"\S+\s*|\s+", text):
+            await asyncio.sleep(self.token_latency * count_tokens(piece))
+            chunk = GenerationChunk(text=piece)
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._usage)
+
+
+# The ScriptedLLM under any CachedLLM / ResilientLLM wrappers, for benchmarks
+# that tune its latency or read its usage counters.
+def scripted(llm: Any) -> ScriptedLLM:
+    while not isinstance(llm, ScriptedLLM):
+        llm = llm.llm
+    return llm
@@ -0,0 +1,266 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM, BaseLLM
+from langchain_core.outputs import GenerationChunk
+
+from llm_gateway import LLM_GATEWAY, get_llm_gateway
+from llm_resilience import ResilientLLM
+
+logger = logging.getLogger("agent")
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "on").lower() not in ("off", "false", "0")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3"))
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+
+
+# Exact-match response store in SQLite. Entries expire after `ttl` seconds and
+# the least recently used ones are evicted once the stored text exceeds
+# `max_bytes`.
+class LLMResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES, ttl: float = LLM_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, temperature: Any, prompt: str, stop: Optional[List[str]]) -> str:
+        payload = json.dumps([model, temperature, prompt, stop or []], ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total -= row[1]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                victims = []
+                for victim, victim_size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if self._total <= self.max_bytes:
+                        break
+                    if victim != key:
+                        victims.append((victim,))
+                        self._total -= victim_size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self._total,
+                    "max_bytes": self.max_bytes, "ttl": self.ttl}
+
+
+_store: Optional[LLMResponseCache] = None
+_store_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LLMResponseCache()
+    return _store
+
+
+# Per-request hit counter. The tracker object is shared (not copied) into
+# executor threads, so hits recorded inside the agent pool are visible to the
+# caller that opened it.
+class CacheTracker:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+_tracker: contextvars.ContextVar[Optional[CacheTracker]] = contextvars.ContextVar("llm_cache_tracker", default=None)
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+@contextmanager
+def track_llm_cache() -> Iterator[CacheTracker]:
+    tracker = CacheTracker()
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+
+# For non-deterministic use (sampling, "try again"): calls inside skip the cache.
+@contextmanager
+def bypass_llm_cache() -> Iterator[None]:
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+# Wraps a text LLM with the exact-match cache. The key covers the model name,
+# temperature, stop sequences and the full rendered prompt (every message in
+# the conversation), so only truly identical calls are served from disk.
+# Misses go to the provider through the LLM gateway (llm_gateway.py), so cache
+# hits never count against rate limits. A ResilientLLM provider is admitted
+# per attempt by the wrapper itself, so it is not gated a second time here.
+class CachedLLM(LLM):
+    llm: BaseLLM
+    store: Any = None
+    enabled: bool = LLM_CACHE_ENABLED
+    gateway: Any = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.store is None and self.enabled:
+            self.store = get_llm_cache()
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.llm._llm_type}"
+
+    @property
+    def model_name(self) -> str:
+        return str(getattr(self.llm, "model", None) or getattr(self.llm, "model_name", None) or self.llm._llm_type)
+
+    def _key(self, prompt: str, stop: Optional[List[str]]) -> Optional[str]:
+        if not self.enabled or self.store is None or _bypass.get():
+            return None
+        return LLMResponseCache.make_key(self.model_name, getattr(self.llm, "temperature", None), prompt, stop)
+
+    def _gateway(self):
+        if isinstance(self.llm, ResilientLLM):
+            return None
+        return self.gateway or (get_llm_gateway() if LLM_GATEWAY else None)
+
+    def _gate(self, prompt: str):
+        gateway = self._gateway()
+        return gateway.slot(prompt) if gateway else nullcontext({})
+
+    def _agate(self, prompt: str):
+        gateway = self._gateway()
+        return gateway.aslot(prompt) if gateway else nullcontext({})
+
+    def _record(self, hit: bool) -> None:
+        tracker = _tracker.get()
+        if tracker is not None:
+            if hit:
+                tracker.hits += 1
+            else:
+                tracker.misses += 1
+
+    def _lookup(self, prompt: str, stop: Optional[List[str]]) -> tuple:
+        key = self._key(prompt, stop)
+        cached = self.store.get(key) if key is not None else None
+        self._record(cached is not None)
+        return key, cached
+
+    # Callback handlers (astream_events, the agent's token forwarder) get every
+    # chunk through on_llm_new_token as it arrives; a cache hit is one chunk.
+    # The inner LLM runs without callbacks so tokens are not reported twice.
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        key, cached = self._lookup(prompt, stop)
+        if cached is not None:
+            if run_manager:
+                run_manager.on_llm_new_token(cached)
+            yield GenerationChunk(text=cached)
+            return
+        parts = []
+        with self._gate(prompt) as usage:
+            for text in self.llm.stream(prompt, stop=stop, config={"callbacks": []}, **kwargs):
+                parts.append(text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+            usage["completion"] = "".join(parts)
+        if key is not None:
+            self.store.put(key, "".join(parts))
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        key, cached = self._lookup(prompt, stop)
+        if cached is not None:
+            if run_manager:
+                await run_manager.on_llm_new_token(cached)
+            yield GenerationChunk(text=cached)
+            return
+        parts = []
+        async with self._agate(prompt) as usage:
+            async for text in self.llm.astream(prompt, stop=stop, config={"callbacks": []}, **kwargs):
+                parts.append(text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+            usage["completion"] = "".join(parts)
+        if key is not None:
+            self.store.put(key, "".join(parts))
+
+    # Plain invoke() streams too whenever someone is listening for tokens.
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        if run_manager and run_manager.handlers:
+            return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+        key, cached = self._lookup(prompt, stop)
+        if cached is not None:
+            return cached
+        with self._gate(prompt) as usage:
+            text = usage["completion"] = self.llm.invoke(prompt, stop=stop, **kwargs)
+        if key is not None:
+            self.store.put(key, text)
+        return text
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        if run_manager and run_manager.handlers:
+            return "".join([chunk.text async for chunk in self._astream(prompt, stop, run_manager, **kwargs)])
+        key, cached = self._lookup(prompt, stop)
+        if cached is not None:
+            return cached
+        async with self._agate(prompt) as usage:
+            text = usage["completion"] = await self.llm.ainvoke(prompt, stop=stop, **kwargs)
+        if key is not None:
+            self.store.put(key, text)
+        return text
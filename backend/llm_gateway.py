@@ -0,0 +1,325 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("agent")
+
+# Every provider call (LLM cache misses) passes through one gateway:
+#   - at most LLM_MAX_CONCURRENCY calls in flight
+#   - LLM_RPM requests and LLM_TPM tokens per minute, as token buckets that
+#     allow a burst of one minute's budget (0 = no limit)
+#   - callers beyond that wait in a queue of at most LLM_QUEUE_SIZE, ordered
+#     by priority ("interactive" before "batch") and then arrival
+#   - a full queue, or a wait longer than LLM_QUEUE_TIMEOUT, raises
+#     LLMOverloaded straight away so the endpoint can answer 429
+# A call is charged its prompt tokens plus LLM_EXPECTED_COMPLETION_TOKENS up
+# front; the estimate is corrected against the real completion afterwards.
+LLM_GATEWAY = os.getenv("LLM_GATEWAY", "on").lower() not in ("off", "false", "0")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "256"))
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+class LLMOverloaded(Exception):
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Priority for LLM calls made in this context (and in threads and tasks
+# started from it): `with llm_priority("batch"): ...`.
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until `amount` is available (requests larger than the whole
+    # bucket only wait for a full one, so they cannot block forever).
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        if self.rate:
+            self.level = min(self.capacity, self.level + amount)
+
+
+# An async waiter also carries its event loop and an asyncio.Event that
+# _notify sets from whichever thread changed the gateway.
+class _Ticket:
+    __slots__ = ("priority", "tokens", "enqueued", "admitted", "loop", "wakeup")
+
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 queue_size: int = LLM_QUEUE_SIZE, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 expected_completion: int = LLM_EXPECTED_COMPLETION_TOKENS):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.expected_completion = expected_completion
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._waiting: List[Any] = []  # heap of (priority rank, seq, ticket)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "paused": 0, "total_wait_s": 0.0,
+                       "max_wait_s": 0.0}
+        self._admitted_by_priority: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    # Seconds until a call of `tokens` could start now (0 = it can), or None
+    # while every concurrency slot is taken. Caller holds the lock.
+    def _ready_in(self, tokens: int) -> Optional[float]:
+        if self.in_flight >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now), self.paused_until - now)
+
+    def _admit(self, ticket: _Ticket) -> _Ticket:
+        self.requests.take(1)
+        self.tokens.take(ticket.tokens)
+        self.in_flight += 1
+        ticket.admitted = True
+        wait = time.monotonic() - ticket.enqueued
+        self._stats["admitted"] += 1
+        self._stats["total_wait_s"] += wait
+        self._stats["max_wait_s"] = max(self._stats["max_wait_s"], wait)
+        self._admitted_by_priority[ticket.priority] = self._admitted_by_priority.get(ticket.priority, 0) + 1
+        return ticket
+
+    def _reject(self, reason: str, retry_after: float) -> LLMOverloaded:
+        logger.warning(json.dumps({"event": "llm_overloaded", "reason": reason, "queue_depth": len(self._waiting),
+                                   "in_flight": self.in_flight}))
+        return LLMOverloaded(f"LLM overloaded: {reason}", retry_after=max(1.0, retry_after))
+
+    # Cheap check for endpoints: would a new call be turned away right now?
+    def overloaded(self) -> bool:
+        with self._cond:
+            return len(self._waiting) >= self.queue_size
+
+    # Wakes every waiter, sync ones through the condition and async ones
+    # through their loop. Caller holds the lock.
+    def _notify(self) -> None:
+        self._cond.notify_all()
+        for _, _, ticket in self._waiting:
+            if ticket.wakeup is not None:
+                try:
+                    ticket.loop.call_soon_threadsafe(ticket.wakeup.set)
+                except RuntimeError:  # the waiter's loop is closed
+                    pass
+
+    # Admits the ticket straight away, or queues it and returns its heap
+    # entry (None when admitted). A full queue raises here, at call time.
+    # Caller holds the lock.
+    def _enqueue(self, ticket: _Ticket) -> Optional[tuple]:
+        if not self._waiting and self._ready_in(ticket.tokens) == 0:
+            self._admit(ticket)
+            return None
+        if len(self._waiting) >= self.queue_size:
+            self._stats["rejected"] += 1
+            raise self._reject("queue full", self._ready_in(ticket.tokens) or 1.0)
+        entry = (PRIORITIES.get(ticket.priority, len(PRIORITIES)), next(self._seq), ticket)
+        heapq.heappush(self._waiting, entry)
+        return entry
+
+    # Admits a queued ticket if it is at the head and may start now. Otherwise
+    # returns how long to wait before looking again, or raises once the
+    # deadline has passed. Caller holds the lock.
+    def _poll(self, entry: tuple, deadline: float, timeout: float) -> float:
+        ticket = entry[2]
+        ready_in = self._ready_in(ticket.tokens)
+        if self._waiting[0] is entry and ready_in == 0:
+            heapq.heappop(self._waiting)
+            self._admit(ticket)
+            self._notify()  # the next waiter is now at the head
+            return 0.0
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._stats["timed_out"] += 1
+            raise self._reject(f"waited {timeout:g}s", ready_in or 1.0)
+        return remaining if ready_in is None or self._waiting[0] is not entry else min(ready_in, remaining)
+
+    def _dequeue(self, entry: tuple) -> None:
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._notify()
+
+    def acquire(self, prompt_tokens: int, priority: Optional[str] = None, timeout: Optional[float] = None) -> _Ticket:
+        ticket = _Ticket(priority or _priority.get(), prompt_tokens + self.expected_completion)
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            entry = self._enqueue(ticket)
+            if entry is None:
+                return ticket
+            deadline = ticket.enqueued + timeout
+            try:
+                while True:
+                    wait = self._poll(entry, deadline, timeout)
+                    if ticket.admitted:
+                        return ticket
+                    self._cond.wait(wait)
+            finally:
+                if not ticket.admitted:
+                    self._dequeue(entry)
+
+    # Admits a call only if it could start right now without jumping the queue
+    # (for optional extra requests such as hedges); None otherwise.
+    def try_acquire(self, prompt_tokens: int, priority: Optional[str] = None) -> Optional[_Ticket]:
+        ticket = _Ticket(priority or _priority.get(), prompt_tokens + self.expected_completion)
+        with self._cond:
+            if not self._waiting and self._ready_in(ticket.tokens) == 0:
+                return self._admit(ticket)
+        return None
+
+    # Async acquire: same queue and clock as acquire, but waits on an
+    # asyncio.Event so the event loop never blocks and no thread is tied up.
+    # The ticket is queued (or rejected) before the first await. Admission
+    # happens inside this coroutine, so a cancelled caller never holds a slot.
+    async def aacquire(self, prompt_tokens: int, priority: Optional[str] = None,
+                       timeout: Optional[float] = None) -> _Ticket:
+        ticket = _Ticket(priority or _priority.get(), prompt_tokens + self.expected_completion)
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            entry = self._enqueue(ticket)
+            if entry is None:
+                return ticket
+            ticket.loop = asyncio.get_running_loop()
+            ticket.wakeup = asyncio.Event()
+        deadline = ticket.enqueued + timeout
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(entry, deadline, timeout)
+                    if ticket.admitted:
+                        return ticket
+                    ticket.wakeup.clear()  # wakeups from here on are scheduled after this
+                try:
+                    await asyncio.wait_for(ticket.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not ticket.admitted:
+                with self._cond:
+                    self._dequeue(entry)
+
+    # The provider said "rate limited, retry after N s": admit nothing new
+    # until then, so queued callers wait instead of hitting the limit again.
+    def pause(self, seconds: float) -> None:
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._stats["paused"] += 1
+            self._notify()
+        logger.warning(json.dumps({"event": "llm_gateway_paused", "seconds": round(seconds, 3)}))
+
+    def release(self, ticket: _Ticket, completion_tokens: Optional[int] = None) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if completion_tokens is not None:
+                # Refund (or charge) the difference from the estimate.
+                self.tokens.adjust(self.expected_completion - completion_tokens)
+            self._notify()
+
+    @contextmanager
+    def slot(self, prompt: str, priority: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        ticket = self.acquire(estimate_tokens(prompt), priority)
+        usage: Dict[str, Any] = {"completion": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, estimate_tokens(usage["completion"]) if usage["completion"] else None)
+
+    @asynccontextmanager
+    async def aslot(self, prompt: str, priority: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        ticket = await self.aacquire(estimate_tokens(prompt), priority)
+        usage: Dict[str, Any] = {"completion": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, estimate_tokens(usage["completion"]) if usage["completion"] else None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            depth = {p: 0 for p in PRIORITIES}
+            for _, _, ticket in self._waiting:
+                depth[ticket.priority] = depth.get(ticket.priority, 0) + 1
+            return {
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": len(self._waiting),
+                "queue_depth_by_priority": depth,
+                "queue_size": self.queue_size,
+                "admitted": stats["admitted"],
+                "admitted_by_priority": dict(self._admitted_by_priority),
+                "rejected": stats["rejected"],
+                "timed_out": stats["timed_out"],
+                "paused": stats["paused"],
+                "paused_for_s": max(0.0, self.paused_until - time.monotonic()),
+                "avg_wait_ms": 1000 * stats["total_wait_s"] / stats["admitted"] if stats["admitted"] else 0.0,
+                "max_wait_ms": 1000 * stats["max_wait_s"],
+                "request_bucket": self.requests.level if self.requests.rate else None,
+                "token_bucket": self.tokens.level if self.tokens.rate else None,
+            }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,481 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManager, AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM, BaseLLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+from llm_gateway import LLM_GATEWAY, LLM_MAX_CONCURRENCY, LLMGateway, LLMOverloaded, estimate_tokens, get_llm_gateway
+from stream_metrics import LatencyWindow
+
+logger = logging.getLogger("agent")
+
+# Provider calls get, per attempt, a deadline of LLM_ATTEMPT_TIMEOUT seconds
+# (for streams: until the first chunk). Timeouts and transient provider errors
+# are retried up to LLM_MAX_RETRIES times with full-jitter exponential backoff
+# (uniform in [0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**n)]).
+#
+# Every attempt and every hedge is admitted by the LLM gateway on its own and
+# holds its slot until the provider call has really finished, so retries,
+# hedges and abandoned attempts all count against LLM_MAX_CONCURRENCY and the
+# RPM/TPM budgets, and no slot is held during a backoff sleep. Rate-limit
+# errors (429 / ResourceExhausted) are not retried here: the gateway is paused
+# for the provider's retry-after and the caller gets LLMOverloaded (a 429).
+#
+# With LLM_HEDGE=on, a non-streaming attempt still running after the
+# LLM_HEDGE_QUANTILE latency of recent calls gets a duplicate request, if the
+# gateway can admit one without queueing; the first answer wins and the other
+# is cancelled. Hedges are capped at LLM_HEDGE_BUDGET of all calls.
+LLM_RESILIENCE = os.getenv("LLM_RESILIENCE", "on").lower() not in ("off", "false", "0")
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_RATE_LIMIT_RETRY_AFTER = float(os.getenv("LLM_RATE_LIMIT_RETRY_AFTER", "5"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "off").lower() in ("on", "true", "1")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_ATTEMPT_THREADS = int(os.getenv("LLM_ATTEMPT_THREADS", "32"))
+
+# Transient errors by class name, so the google / httpx exception modules do
+# not have to be importable here.
+RETRYABLE_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "BadGateway",
+                    "GatewayTimeout", "Aborted", "RemoteProtocolError"}
+RETRYABLE_STATUS = {408, 500, 502, 503, 504}
+RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests", "RateLimitError"}
+
+
+class LLMAttemptTimeout(TimeoutError):
+    pass
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return any(cls.__name__ in RATE_LIMIT_ERRORS for cls in type(error).__mro__) or _status(error) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    return _status(error) in RETRYABLE_STATUS
+
+
+# Seconds the provider asked us to wait: a retry_after attribute, a
+# Retry-After header, or google.rpc.RetryInfo in the error details.
+def provider_retry_after(error: BaseException) -> float:
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        for detail in getattr(error, "details", None) or []:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None:
+                value = delay.seconds + delay.nanos / 1e9
+                break
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return LLM_RATE_LIMIT_RETRY_AFTER
+
+
+def backoff_delay(retry: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    return random.uniform(0, min(cap, base * 2 ** retry))
+
+
+# Sync attempts run here so they can be given a deadline and raced against a
+# hedge. A timed-out or losing sync call cannot be interrupted; its thread (and
+# its gateway slot) is released when the provider call returns ("abandoned").
+# With the gateway on, only admitted calls hold a thread, so the pool is sized
+# to at least LLM_MAX_CONCURRENCY.
+_attempts = ThreadPoolExecutor(max_workers=max(LLM_ATTEMPT_THREADS, LLM_MAX_CONCURRENCY),
+                               thread_name_prefix="llm-attempt")
+
+
+def _submit(fn: Callable, *args: Any):
+    return _attempts.submit(contextvars.copy_context().run, fn, *args)
+
+
+# One gateway admission (or none, with the gateway off), released exactly once
+# with the completion text so the token budget can be corrected.
+class _Slot:
+    __slots__ = ("gateway", "ticket", "_released")
+
+    def __init__(self, gateway: Optional[LLMGateway] = None, ticket: Any = None):
+        self.gateway = gateway
+        self.ticket = ticket
+        self._released = False
+
+    def release(self, completion: Optional[str] = None) -> None:
+        if self.gateway is None or self._released:
+            return
+        self._released = True
+        self.gateway.release(self.ticket, estimate_tokens(completion) if completion else None)
+
+
+class ResilientLLM(LLM):
+    llm: BaseLLM
+    label: str = "llm"
+    gateway: Any = None  # default: the shared gateway, unless LLM_GATEWAY=off
+    attempt_timeout: float = LLM_ATTEMPT_TIMEOUT
+    max_retries: int = LLM_MAX_RETRIES
+    backoff_base: float = LLM_BACKOFF_BASE
+    backoff_max: float = LLM_BACKOFF_MAX
+    hedge: bool = LLM_HEDGE
+    hedge_quantile: float = LLM_HEDGE_QUANTILE
+    hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES
+    hedge_budget: float = LLM_HEDGE_BUDGET
+
+    _latency: Any = PrivateAttr(default_factory=LatencyWindow)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: Dict[str, int] = PrivateAttr(default_factory=lambda: {
+        "calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "failures": 0, "rate_limited": 0,
+        "hedged": 0, "hedge_wins": 0, "hedges_skipped": 0, "cancelled": 0, "abandoned": 0})
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        _instances[self.label] = self
+
+    @property
+    def _llm_type(self) -> str:
+        return self.llm._llm_type
+
+    # CachedLLM keys on these, so wrapping a provider keeps its cache entries.
+    @property
+    def model_name(self) -> str:
+        return str(getattr(self.llm, "model", None) or getattr(self.llm, "model_name", None) or self.llm._llm_type)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.llm, "temperature", None)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def _gateway(self) -> Optional[LLMGateway]:
+        return self.gateway or (get_llm_gateway() if LLM_GATEWAY else None)
+
+    def _acquire(self, prompt: str) -> _Slot:
+        gateway = self._gateway()
+        return _Slot(gateway, gateway.acquire(estimate_tokens(prompt))) if gateway else _Slot()
+
+    async def _aacquire(self, prompt: str) -> _Slot:
+        gateway = self._gateway()
+        return _Slot(gateway, await gateway.aacquire(estimate_tokens(prompt))) if gateway else _Slot()
+
+    # A hedge only goes out if the gateway has room right now.
+    def _try_acquire(self, prompt: str) -> Optional[_Slot]:
+        gateway = self._gateway()
+        if gateway is None:
+            return _Slot()
+        ticket = gateway.try_acquire(estimate_tokens(prompt))
+        return _Slot(gateway, ticket) if ticket is not None else None
+
+    # Seconds after which an attempt is hedged, or None (hedging off, too few
+    # samples for a percentile, or the hedge budget is spent).
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self._latency.count < self.hedge_min_samples:
+            return None
+        with self._lock:
+            if self._stats["hedged"] >= self.hedge_budget * self._stats["calls"]:
+                return None
+        return self._latency.quantile(self.hedge_quantile)
+
+    def _log_retry(self, retry: int, error: BaseException, delay: float) -> None:
+        logger.warning(json.dumps({"event": "llm_retry", "llm": self.label, "retry": retry + 1,
+                                   "error": f"{type(error).__name__}: {error}"[:200], "backoff_s": round(delay, 3)}))
+
+    # Decides what a failed attempt turns into: None to retry after a backoff,
+    # or the exception to raise.
+    def _failed(self, retry: int, error: Exception) -> Optional[BaseException]:
+        if is_rate_limited(error):
+            retry_after = provider_retry_after(error)
+            gateway = self._gateway()
+            if gateway is not None:
+                gateway.pause(retry_after)
+            self._count("rate_limited")
+            overloaded = LLMOverloaded(f"LLM provider rate limit: {type(error).__name__}", retry_after=retry_after)
+            overloaded.__cause__ = error
+            return overloaded
+        if retry >= self.max_retries or not is_retryable(error):
+            self._count("failures")
+            return error
+        self._count("retries")
+        return None
+
+    def _retrying(self, attempt: Callable[[], Any]) -> Any:
+        for retry in range(self.max_retries + 1):
+            self._count("attempts")
+            try:
+                return attempt()
+            except Exception as e:
+                final = self._failed(retry, e)
+                if final is e:
+                    raise
+                if final is not None:
+                    raise final
+                delay = backoff_delay(retry, self.backoff_base, self.backoff_max)
+                self._log_retry(retry, e, delay)
+                time.sleep(delay)
+
+    async def _aretrying(self, attempt: Callable[[], Any]) -> Any:
+        for retry in range(self.max_retries + 1):
+            self._count("attempts")
+            try:
+                return await attempt()
+            except Exception as e:
+                final = self._failed(retry, e)
+                if final is e:
+                    raise
+                if final is not None:
+                    raise final
+                delay = backoff_delay(retry, self.backoff_base, self.backoff_max)
+                self._log_retry(retry, e, delay)
+                await asyncio.sleep(delay)
+
+    # One provider request. The slot is released here, when the request has
+    # really finished, even if the caller stopped waiting for it long ago.
+    def _timed_invoke(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any], slot: _Slot) -> tuple:
+        start = time.monotonic()
+        text = None
+        try:
+            text = self.llm.invoke(prompt, stop=stop, config={"callbacks": []}, **kwargs)
+            return text, time.monotonic() - start
+        finally:
+            slot.release(text)
+
+    async def _atimed_invoke(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any],
+                             slot: _Slot) -> tuple:
+        start = time.monotonic()
+        text = None
+        try:
+            # An empty manager rather than []: agenerate indexes callbacks[0].
+            text = await self.llm.ainvoke(prompt, stop=stop, config={"callbacks": AsyncCallbackManager([])}, **kwargs)
+            return text, time.monotonic() - start
+        finally:
+            slot.release(text)
+
+    def _won(self, elapsed: float, hedge_won: bool) -> None:
+        self._latency.observe(elapsed)
+        if hedge_won:
+            self._count("hedge_wins")
+
+    # One attempt: the call, plus a hedge once it runs past the hedge delay.
+    # A failure of one request is only final when no other is still running.
+    # The deadline starts once the gateway has admitted the call.
+    def _race(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        hedge_at = self._hedge_delay()
+        slot = self._acquire(prompt)
+        started = time.monotonic()
+        deadline = started + self.attempt_timeout
+        primary = _submit(self._timed_invoke, prompt, stop, kwargs, slot)
+        pending = {primary}
+        error: Optional[BaseException] = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, started + hedge_at - now))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text, elapsed = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._won(elapsed, future is not primary)
+                self._drop(pending)
+                return text
+            if hedge_at is not None and pending and time.monotonic() >= started + hedge_at:
+                hedge_at = None
+                hedge_slot = self._try_acquire(prompt)
+                if hedge_slot is None:
+                    self._count("hedges_skipped")
+                else:
+                    self._count("hedged")
+                    pending.add(_submit(self._timed_invoke, prompt, stop, kwargs, hedge_slot))
+        if error is not None and not pending:
+            raise error
+        self._drop(pending)
+        self._count("timeouts")
+        raise LLMAttemptTimeout(f"LLM call exceeded {self.attempt_timeout:g}s")
+
+    def _drop(self, futures) -> None:
+        for future in futures:
+            self._count("cancelled" if future.cancel() else "abandoned")
+
+    async def _arace(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        hedge_at = self._hedge_delay()
+        slot = await self._aacquire(prompt)
+        started = time.monotonic()
+        deadline = started + self.attempt_timeout
+        primary = asyncio.ensure_future(self._atimed_invoke(prompt, stop, kwargs, slot))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, started + hedge_at - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        text, elapsed = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self._won(elapsed, task is not primary)
+                    return text
+                if hedge_at is not None and pending and time.monotonic() >= started + hedge_at:
+                    hedge_at = None
+                    hedge_slot = self._try_acquire(prompt)
+                    if hedge_slot is None:
+                        self._count("hedges_skipped")
+                    else:
+                        self._count("hedged")
+                        pending.add(asyncio.ensure_future(self._atimed_invoke(prompt, stop, kwargs, hedge_slot)))
+            if error is not None and not pending:
+                raise error
+            self._count("timeouts")
+            raise LLMAttemptTimeout(f"LLM call exceeded {self.attempt_timeout:g}s")
+        finally:
+            # Losers, timed-out attempts, and everything if we were cancelled;
+            # a cancelled request releases its own slot.
+            for task in pending:
+                task.cancel()
+                self._count("cancelled")
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        self._count("calls")
+        return self._retrying(lambda: self._race(prompt, stop, kwargs))
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        self._count("calls")
+        return await self._aretrying(lambda: self._arace(prompt, stop, kwargs))
+
+    # Streams are not hedged (two token streams cannot be merged). The
+    # deadline covers the first chunk, and only failures before it are
+    # retried: once tokens have reached the client the stream is committed.
+    # The slot is held until the stream ends or the consumer drops it.
+    def _open_stream(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> tuple:
+        slot = self._acquire(prompt)
+        started = time.monotonic()
+        chunks = iter(self.llm.stream(prompt, stop=stop, config={"callbacks": []}, **kwargs))
+        first = _submit(next, chunks, None)
+        done, _ = wait({first}, timeout=self.attempt_timeout)
+        if not done:
+            first.add_done_callback(lambda f: slot.release())
+            self._drop({first})
+            self._count("timeouts")
+            raise LLMAttemptTimeout(f"LLM stream sent nothing for {self.attempt_timeout:g}s")
+        try:
+            text = first.result()
+        except BaseException:
+            slot.release()
+            raise
+        self._latency.observe(time.monotonic() - started)
+        return text, chunks, slot
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        self._count("calls")
+        first, chunks, slot = self._retrying(lambda: self._open_stream(prompt, stop, kwargs))
+        parts = []
+        try:
+            if first is None:
+                return
+            for text in itertools.chain([first], chunks):
+                parts.append(text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+        finally:
+            slot.release("".join(parts))
+
+    async def _aopen_stream(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> tuple:
+        slot = await self._aacquire(prompt)
+        started = time.monotonic()
+        chunks = self.llm.astream(prompt, stop=stop, config={"callbacks": []}, **kwargs).__aiter__()
+        try:
+            first = await asyncio.wait_for(chunks.__anext__(), self.attempt_timeout)
+        except StopAsyncIteration:
+            return None, chunks, slot
+        except asyncio.TimeoutError:
+            slot.release()
+            self._count("timeouts")
+            raise LLMAttemptTimeout(f"LLM stream sent nothing for {self.attempt_timeout:g}s")
+        except BaseException:
+            slot.release()
+            raise
+        self._latency.observe(time.monotonic() - started)
+        return first, chunks, slot
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        self._count("calls")
+        first, chunks, slot = await self._aretrying(lambda: self._aopen_stream(prompt, stop, kwargs))
+        parts = []
+        try:
+            if first is None:
+                return
+            parts.append(first)
+            if run_manager:
+                await run_manager.on_llm_new_token(first)
+            yield GenerationChunk(text=first)
+            async for text in chunks:
+                parts.append(text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+        finally:
+            slot.release("".join(parts))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        hedge_delay = self._latency.quantile(self.hedge_quantile) if self.hedge else None
+        stats["hedge_delay_ms"] = 1000 * hedge_delay if hedge_delay is not None else None
+        stats["latency"] = self._latency.stats()
+        return stats
+
+
+_instances: Dict[str, ResilientLLM] = {}
+
+def resilience_stats() -> Dict[str, Dict[str, Any]]:
+    return {label: llm.stats() for label, llm in list(_instances.items())}
+
+
+# Wraps a provider LLM (inside CachedLLM, so cache hits skip all of this). The
+# provider client's own retry loop is turned off, otherwise the two multiply.
+def resilient(llm: BaseLLM, label: str = "llm") -> BaseLLM:
+    if not LLM_RESILIENCE:
+        return llm
+    if getattr(llm, "max_retries", None):
+        llm = llm.model_copy(update={"max_retries": 1})
+    return ResilientLLM(llm=llm, label=label)
@@ -0,0 +1,70 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Fraction of DEBUG/INFO events that are emitted (1.0 = all). Warnings and
+# errors are never sampled out.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# LOG_QUEUE=off keeps the handlers synchronous (handy when debugging logging).
+LOG_QUEUE = os.getenv("LOG_QUEUE", "on").lower() not in ("off", "false", "0")
+
+
+# Log message whose JSON is only rendered when a handler formats the record,
+# i.e. on the queue listener thread rather than on the caller.
+class JsonMessage:
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return json.dumps(self.payload, default=str)
+
+
+# Structured event: `log_event(logger, logging.DEBUG, "tool_loaded", tool_name=n)`.
+# Returns before building anything when the level is disabled or the event is
+# sampled out, so call sites must not compute expensive fields up front; pass
+# them as zero-argument callables instead and they are only evaluated when the
+# event is actually emitted.
+def log_event(logger: logging.Logger, level: int, event: str, sample: Optional[float] = None, **fields: Any) -> None:
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATE if sample is None else sample
+    if level < logging.WARNING and rate < 1.0 and random.random() >= rate:
+        return
+    payload = {"event": event}
+    for key, value in fields.items():
+        payload[key] = value() if callable(value) else value
+    logger.log(level, JsonMessage(payload))
+
+
+# QueueHandler that hands the record over unformatted. The stock prepare()
+# formats on the calling thread, which is exactly the work we want to move off
+# the event loop. Payloads are built fresh per event, so deferring is safe.
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listeners: Dict[str, QueueListener] = {}
+
+# Moves a logger's handlers behind a queue: callers only enqueue the record and
+# a listener thread does formatting and I/O. Idempotent per logger.
+def setup_queue_logging(logger: logging.Logger) -> None:
+    if not LOG_QUEUE or logger.name in _listeners or not logger.handlers:
+        return
+    handlers = list(logger.handlers)
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(_DeferredQueueHandler(records))
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[logger.name] = listener
+    atexit.register(listener.stop)
+
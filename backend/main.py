@@ -1,68 +1,223 @@
 from fastapi import FastAPI, WebSocket, HTTPException
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from langchain_core.messages import HumanMessage
 from test_resoning import app as langgraph_app  # Your compiled LangGraph agent
 import traceback
 from asyncio import sleep
 from fastapi import WebSocket
 from langchain_core.messages import AIMessage, ToolMessage, SystemMessage
+from tool_cache import cache_stats
+from search_client import get_search_client
+from llm_cache import get_llm_cache
+from state_stream import StateStream, encode_frame
+from stream_metrics import latency_stats, observe_latency
+from conversation_memory import memory_stats
+from prompt_builder import prompt_stats
+from sandbox import SANDBOX, get_sandbox, sandbox_stats
+from llm_gateway import LLMOverloaded, get_llm_gateway, llm_priority
+from llm_resilience import resilience_stats
+from typing import List, Optional
+import asyncio
+import json
+import os
+import time
 
 
 # Initialize FastAPI app
 app = FastAPI(title="LangGraph Tool Agent API")
 
+# Fork the generated-tool sandbox before the first request needs it.
+@app.on_event("startup")
+async def start_sandbox():
+    if SANDBOX:
+        await asyncio.to_thread(get_sandbox)
+
 # Request model for REST
 class QueryRequest(BaseModel):
     query: str
 
+class BatchRequest(BaseModel):
+    queries: List[str]
+    concurrency: Optional[int] = None
+
+# Graph runs started over REST share GRAPH_MAX_CONCURRENCY slots, so a burst of
+# requests or one large batch queues instead of piling onto the LLM and the
+# thread pool. A batch may ask for fewer slots, never more than BATCH_CONCURRENCY.
+GRAPH_MAX_CONCURRENCY = int(os.getenv("GRAPH_MAX_CONCURRENCY", "16"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "10000"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "120"))
+_graph_slots = asyncio.Semaphore(GRAPH_MAX_CONCURRENCY)
+
+# One graph run: the content of the last message after every step, as
+# /api/query has always returned it.
+async def run_query(query: str) -> List[str]:
+    async with _graph_slots:
+        inputs = {"messages": [HumanMessage(content=query)]}
+        return [s["messages"][-1].content async for s in langgraph_app.astream(inputs, stream_mode="values")
+                if hasattr(s["messages"][-1], "content")]
+
+# An overloaded LLM gateway (llm_gateway.py) answers 429 with Retry-After
+# instead of letting requests queue without bound.
+def _overloaded_response(e: LLMOverloaded) -> JSONResponse:
+    return JSONResponse(status_code=429, headers={"Retry-After": str(int(e.retry_after + 0.999))},
+                        content={"status": "error", "detail": str(e), "retry_after": e.retry_after})
+
 # POST endpoint (non-streaming)
 @app.post("/api/query")
 async def query_agent(request: QueryRequest):
+    if get_llm_gateway().overloaded():
+        return _overloaded_response(LLMOverloaded("LLM overloaded: queue full"))
     try:
-        inputs = {"messages": [HumanMessage(content=request.query)]}
-        result = list(langgraph_app.stream(inputs, stream_mode="values"))
-        messages = [s["messages"][-1].content for s in result if hasattr(s["messages"][-1], "content")]
+        messages = await run_query(request.query)
         return JSONResponse(content={"status": "success", "data": messages})
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"status": "error", "detail": str(e)})
 
+# Batch endpoint. Streams NDJSON, one line per query in completion order:
+#   {"type": "result", "index": i, "query": ..., "status": "success", "data": [...], "ms": ...}
+#   {"type": "result", "index": i, "query": ..., "status": "error", "detail": ..., "ms": ...}
+# then {"type": "summary", ...}. Repeated queries (same text after trimming)
+# run once and every copy gets the result, with "deduplicated": true. A
+# failing or timed-out query only fails its own lines. Batch LLM calls queue
+# behind interactive ones; a query turned away by the gateway gets
+# "retry_after" on its lines.
+def _ndjson(payload) -> bytes:
+    return (json.dumps(payload, default=str) + "\n").encode()
+
+@app.post("/api/batch")
+async def batch_query(request: BatchRequest):
+    if not request.queries:
+        raise HTTPException(status_code=422, detail="queries is empty")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX_QUERIES} queries per batch")
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    positions = {}
+    for index, query in enumerate(request.queries):
+        positions.setdefault(query.strip(), []).append(index)
+    return StreamingResponse(_run_batch(request.queries, positions, concurrency), media_type="application/x-ndjson")
+
+async def _run_batch(queries: List[str], positions, concurrency: int):
+    started = time.perf_counter()
+    pending: "asyncio.Queue[str]" = asyncio.Queue()
+    for key in positions:
+        pending.put_nowait(key)
+    done: asyncio.Queue = asyncio.Queue()
+
+    # `concurrency` workers pull unique queries, so a batch of thousands never
+    # has more than that many runs (or tasks) in flight.
+    async def worker():
+        while True:
+            try:
+                key = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            item_start = time.perf_counter()
+            try:
+                with llm_priority("batch"):
+                    data = await asyncio.wait_for(run_query(key), BATCH_ITEM_TIMEOUT)
+                outcome = {"status": "success", "data": data}
+            except asyncio.TimeoutError:
+                outcome = {"status": "error", "detail": f"timed out after {BATCH_ITEM_TIMEOUT:g}s"}
+            except LLMOverloaded as e:
+                outcome = {"status": "error", "detail": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                outcome = {"status": "error", "detail": str(e)}
+            elapsed = time.perf_counter() - item_start
+            observe_latency("batch_item", elapsed)
+            await done.put((key, outcome, elapsed))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(positions)))]
+    succeeded = failed = 0
+    try:
+        for _ in range(len(positions)):
+            key, outcome, elapsed = await done.get()
+            indices = positions[key]
+            for n, index in enumerate(indices):
+                line = {"type": "result", "index": index, "query": queries[index], **outcome, "ms": elapsed * 1000}
+                if n:
+                    line["deduplicated"] = True
+                yield _ndjson(line)
+            if outcome["status"] == "success":
+                succeeded += len(indices)
+            else:
+                failed += len(indices)
+        yield _ndjson({"type": "summary", "total": len(queries), "unique": len(positions), "succeeded": succeeded,
+                       "failed": failed, "concurrency": len(workers), "ms": (time.perf_counter() - started) * 1000})
+    finally:
+        # Client went away (or we are done): stop scheduling new queries.
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+# Runtime metrics
+@app.get("/api/metrics")
+async def metrics():
+    return JSONResponse(content={"tool_cache": cache_stats(), "search": get_search_client().stats(),
+                                 "llm_cache": get_llm_cache().stats(), "latency": latency_stats(),
+                                 "memory": memory_stats(), "prompts": prompt_stats(),
+                                 "sandbox": sandbox_stats(), "llm_gateway": get_llm_gateway().stats(),
+                                 "llm_resilience": resilience_stats()})
+
 # WebSocket endpoint (streaming)
 
+# Event types: "token" (LLM output as it is generated, tagged with the graph
+# node), "tool_start" / "tool_result" (in the order the tools actually run),
+# "ai" (each complete model message), then "end" with time to first token.
 @app.websocket("/ws/query")
 async def websocket_query(websocket: WebSocket):
     await websocket.accept()
     try:
         query = await websocket.receive_text()
+        started = time.perf_counter()
+        ttft = None
         inputs = {"messages": [HumanMessage(content=query)]}
+        await websocket.send_json({"type": "other", "content": query})
 
-        # Iterate over the async generator
-        async for step in langgraph_app.astream(inputs, stream_mode="values"):
-            if "messages" in step and step["messages"]:
-                message = step["messages"][-1]
-                
-                # For AI responses
-                if isinstance(message, AIMessage):
-                    await websocket.send_json({
-                        "type": "ai",
-                        "content": message.content
-                    })
-                
-                # For tool results
-                elif isinstance(message, ToolMessage):
-                    await websocket.send_json({
-                        "type": "tool_result",
-                        "content": message.content
-                    })
+        async for event in langgraph_app.astream_events(inputs, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            # Tokens, including the reasoning text before tool calls
+            if kind == "on_llm_stream":
+                text = event["data"]["chunk"].text
+                if not text:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    observe_latency("ws_query_ttft", ttft)
+                await websocket.send_json({"type": "token", "node": node, "content": text})
 
-                # For anything else (e.g., SystemMessage, etc.)
-                else:
+            # Tool calls
+            elif kind == "on_tool_start":
+                await websocket.send_json({
+                    "type": "tool_start",
+                    "name": event["name"],
+                    "input": event["data"].get("input")
+                })
+            elif kind == "on_tool_end":
+                output = event["data"].get("output")
+                await websocket.send_json({
+                    "type": "tool_result",
+                    "name": event["name"],
+                    "content": getattr(output, "content", str(output))
+                })
+
+            # Complete AI responses
+            elif kind == "on_chain_end" and node == "agent" and event["name"] == "agent":
+                for message in event["data"]["output"].get("messages", []):
                     await websocket.send_json({
-                        "type": "other",
-                        "content": getattr(message, "content", str(message))
+                        "type": "ai",
+                        "content": message.content,
+                        "cached": message.response_metadata.get("llm_cache_hit", False)
                     })
 
-        await websocket.send_json({"type": "end"})
+        await websocket.send_json({"type": "end", "ttft_ms": ttft * 1000 if ttft is not None else None})
+    except LLMOverloaded as e:
+        await websocket.send_json({"type": "error", "status": 429, "detail": str(e), "retry_after": e.retry_after})
     except Exception as e:
         await websocket.send_json({
             "type": "error",
@@ -71,3 +226,43 @@ async def websocket_query(websocket: WebSocket):
         })
     finally:
         await websocket.close()
+
+
+# Delta-streamed state of the ReAct agent graph (agent.run_agent). The first
+# text message is the query. Frames are state_snapshot / state_delta objects
+# with sequence numbers, see state_stream.py. Send {"type": "resync"} at any
+# time to get a full snapshot as the next frame.
+@app.websocket("/ws/agent")
+async def websocket_agent(websocket: WebSocket):
+    import agent  # loaded on first use; importing it builds the agent graph
+
+    await websocket.accept()
+    stream = StateStream(agent.STREAM_MODE)
+
+    async def send_frame(frame):
+        await websocket.send_text(encode_frame(frame).decode())
+
+    async def listen_for_resync():
+        while True:
+            # A malformed frame is skipped; it must not end the listener.
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "resync":
+                stream.request_resync()
+
+    listener = None
+    try:
+        query = await websocket.receive_text()
+        listener = asyncio.create_task(listen_for_resync())
+        await agent.run_agent(query, send_frame, stream=stream)
+        await websocket.send_json({"type": "end", "seq": stream.seq})
+    except LLMOverloaded as e:
+        await websocket.send_json({"type": "error", "status": 429, "detail": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+    finally:
+        if listener:
+            listener.cancel()
+        await websocket.close()
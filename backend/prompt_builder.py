@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import yaml
+
+from log_utils import log_event
+
+logger = logging.getLogger("agent")
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "16"))
+
+
+# Rendered prompts, memoized by everything they depend on. Callers pass a key
+# that changes whenever the inputs do: the identity of the tool objects (which
+# load_tool only replaces when a tool file or the registry changes), a YAML
+# file signature, the tool-call mode. A new key simply renders a new entry, so
+# there is nothing to invalidate by hand.
+#
+# Prompts should be laid out most-stable first: fixed instructions, then the
+# tool list, then per-mode text, with the conversation last. Rendering the
+# same bytes every time keeps that prefix identical across calls, so provider
+# side context caching (and our own LLM cache) can reuse it.
+class PromptBuilder:
+    def __init__(self, name: str, render: Callable[..., Any], maxsize: int = PROMPT_CACHE_SIZE):
+        self.name = name
+        self.render = render
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        _builders[name] = self
+
+    def get(self, key: Hashable, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # Rendering is pure, so two threads racing on a new key just do the
+        # work twice and store equal values.
+        prompt = self.render(*args, **kwargs)
+        with self._lock:
+            self._data[key] = prompt
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        log_event(logger, logging.INFO, "prompt_rendered", builder=self.name,
+                  digest=lambda: hashlib.sha1(str(getattr(prompt, "content", prompt)).encode()).hexdigest()[:12])
+        return prompt
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_builders: Dict[str, PromptBuilder] = {}
+
+def prompt_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: builder.stats() for name, builder in list(_builders.items())}
+
+
+# Cheap identity of a tool set: load_tool returns the same objects until
+# their module or registry entry changes.
+def tools_fingerprint(tools: Any) -> Tuple[int, ...]:
+    return tuple(id(t) for t in tools)
+
+
+# YAML prompt files, re-parsed only when their (mtime_ns, size) changes.
+_prompt_files: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_prompt_files_lock = threading.Lock()
+
+def load_prompt_file(path: str, field: str = "system_prompt") -> str:
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _prompt_files.get(key + "#" + field)
+    if cached and cached[0] == signature:
+        return cached[1]
+    with _prompt_files_lock:
+        with open(key) as f:
+            config = yaml.safe_load(f) or {}
+        prompt = config.get(field, "")
+        if not prompt:
+            raise ValueError("System prompt is empty or missing in YAML")
+        _prompt_files[key + "#" + field] = (signature, prompt)
+    logger.info(json.dumps({"event": "prompt_loaded", "path": path}))
+    return prompt
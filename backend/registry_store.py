@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; appends are then only serialized in-process
+    fcntl = None
+
+logger = logging.getLogger("agent")
+
+DEFAULT_REGISTRY_PATH = "tools/tool_registry.yaml"
+
+
+# Tool registry backed by an append-only JSON-lines log.
+#
+# Every write appends one record ({"op": "add", "entry": {...}} or
+# {"op": "delete", "name": ...}) and the in-process index (name -> entry) is
+# updated from the log tail only. Reads never touch the disk beyond an os.stat
+# used to notice appends made by other processes. The YAML registry is still
+# supported: it seeds the log on first use and can be regenerated with
+# export_yaml() for older tooling.
+class ToolRegistryStore:
+    def __init__(self, log_path: str, yaml_path: Optional[str] = None):
+        self.log_path = log_path
+        self.yaml_path = yaml_path
+        self._lock = threading.RLock()
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._changes: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+        self._offset = 0
+        self._inode = None
+        if not os.path.exists(log_path) and yaml_path and os.path.exists(yaml_path):
+            self.import_yaml(yaml_path)
+        self.refresh()
+
+    # Monotonic within the process; bumped by every applied change.
+    @property
+    def version(self) -> int:
+        self.refresh()
+        return len(self._changes)
+
+    def refresh(self) -> None:
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino == self._inode and st.st_size == self._offset:
+            return
+        with self._lock:
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # The log was replaced (compaction or re-import): rebuild from scratch.
+                if self._inode is not None:
+                    self._changes.append(("reset", None))
+                self._index = {}
+                self._offset = 0
+                self._inode = st.st_ino
+            self._read_tail()
+
+    def _read_tail(self) -> None:
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only consume complete lines; a concurrent writer may be mid-append.
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += end
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        if op == "add":
+            entry = record["entry"]
+            self._index[entry["name"]] = entry
+            self._changes.append(("add", entry))
+        elif op == "delete":
+            entry = self._index.pop(record["name"], None)
+            if entry is not None:
+                self._changes.append(("delete", entry))
+        else:
+            logger.error(json.dumps({"event": "registry_bad_record", "record": str(record)[:100]}))
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        payload = "".join(json.dumps(r, sort_keys=True) + "\n" for r in records)
+        with open(self.log_path, "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(payload)
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # Reads
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._index.get(name)
+
+    def exists(self, name: str) -> bool:
+        self.refresh()
+        return name in self._index
+
+    def entries(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return list(self._index.values())
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index)
+
+    def changes_since(self, version: int) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        self.refresh()
+        return self._changes[version:]
+
+    # Writes
+    def add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.refresh()
+            if entry["name"] in self._index:
+                raise ValueError(f"Tool '{entry['name']}' already exists")
+            self._append([{"op": "add", "entry": entry}])
+            self.refresh()
+        logger.info(json.dumps({"event": "registry_add", "tool_name": entry["name"]}))
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self.refresh()
+            if name not in self._index:
+                raise ValueError(f"Tool '{name}' not found in registry")
+            self._append([{"op": "delete", "name": name}])
+            self.refresh()
+        logger.info(json.dumps({"event": "registry_delete", "tool_name": name}))
+
+    def compact(self) -> None:
+        # Rewrite the log with only the live entries; readers pick it up via the inode change.
+        with self._lock:
+            entries = self.entries()
+            self._write_log(entries)
+            self.refresh()
+        logger.info(json.dumps({"event": "registry_compacted", "entries": len(entries)}))
+
+    def _write_log(self, entries: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps({"op": "add", "entry": entry}, sort_keys=True) + "\n")
+        os.replace(tmp_path, self.log_path)
+
+    # YAML compatibility
+    def import_yaml(self, yaml_path: str) -> None:
+        with open(yaml_path) as f:
+            registry = yaml.safe_load(f) or []
+        entries = {}
+        for entry in registry:
+            if entry.get("name"):
+                entries[entry["name"]] = entry
+        with self._lock:
+            self._write_log(list(entries.values()))
+            self.refresh()
+        logger.info(json.dumps({"event": "registry_imported", "path": yaml_path, "entries": len(entries)}))
+
+    def export_yaml(self, yaml_path: Optional[str] = None) -> str:
+        yaml_path = yaml_path or self.yaml_path
+        if not yaml_path:
+            raise ValueError("No YAML path to export to")
+        with open(yaml_path, "w") as f:
+            yaml.dump(self.entries(), f)
+        return yaml_path
+
+
+_stores: Dict[str, ToolRegistryStore] = {}
+_stores_lock = threading.Lock()
+
+# Returns the shared store for a registry. A YAML path maps to the sibling
+# .jsonl log, which is seeded from the YAML the first time it is opened.
+def get_registry(registry_path: str = DEFAULT_REGISTRY_PATH) -> ToolRegistryStore:
+    key = os.path.abspath(registry_path)
+    store = _stores.get(key)
+    if store is not None:
+        return store
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            base, ext = os.path.splitext(registry_path)
+            if ext in (".yaml", ".yml"):
+                store = ToolRegistryStore(base + ".jsonl", yaml_path=registry_path)
+            else:
+                store = ToolRegistryStore(registry_path)
+            _stores[key] = store
+        return store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tool registry maintenance")
+    parser.add_argument("command", choices=["import", "export", "compact", "list"])
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_PATH)
+    args = parser.parse_args()
+
+    store = get_registry(args.registry)
+    if args.command == "import":
+        store.import_yaml(store.yaml_path or args.registry)
+    elif args.command == "export":
+        print(f"Exported to {store.export_yaml()}")
+    elif args.command == "compact":
+        store.compact()
+    else:
+        for entry in store.entries():
+            print(f"- {entry['name']}: {entry.get('description', '')}")
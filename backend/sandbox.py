@@ -0,0 +1,286 @@
+import atexit
+import importlib.util
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import ToolException
+
+try:
+    import resource
+except ImportError:  # not available on Windows; calls then only get the wall-clock timeout
+    resource = None
+
+logger = logging.getLogger("agent")
+
+# Generated tools run in a warm pool of worker processes instead of in the API
+# process. Each call gets SANDBOX_CPU_SECONDS of CPU time and
+# SANDBOX_MEMORY_MB of extra address space on top of the preloaded worker, and
+# the caller gives up after SANDBOX_TIMEOUT seconds, killing and replacing the
+# worker. SANDBOX=off runs them in-process as before.
+SANDBOX = os.getenv("SANDBOX", "on").lower() not in ("off", "false", "0")
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "5"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "2"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+SANDBOX_TOOL_FILES = [p for p in os.getenv("SANDBOX_TOOL_FILES", "tools/generated_tools.py").split(",") if p]
+
+
+# Raised to the agent as a tool error (handle_tool_error=True), so a runaway
+# tool costs one observation instead of the whole run.
+class SandboxError(ToolException):
+    pass
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class _CPULimitExceeded(Exception):
+    pass
+
+
+# ---- worker side -------------------------------------------------------------
+
+def _raise_cpu_limit(signum, frame):
+    raise _CPULimitExceeded("CPU time limit exceeded")
+
+
+def _vm_size() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# RLIMIT_CPU counts the whole process lifetime, so the per-call cap is set
+# relative to the CPU already used. The soft limit delivers SIGXCPU, which
+# becomes an exception and leaves the worker warm. Anything stuck in a single C
+# call ignores it until it returns; the caller's wall-clock timeout covers that.
+def _limit_cpu(seconds: Optional[int]) -> None:
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds is None:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _limit_memory(headroom_mb: int) -> None:
+    base = _vm_size()
+    if resource is None or base is None or headroom_mb <= 0:
+        return
+    limit = base + headroom_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _load_module(path: str, modules: Dict[str, Tuple[Tuple[int, int], Any]]) -> Any:
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = modules.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    modules[path] = (signature, module)
+    return module
+
+
+# Requests are (path, tool name, args, kwargs, cpu seconds); replies are ("ok", value)
+# or ("error", exception type, message). Tool modules are imported once per
+# worker and only re-imported when the file changes.
+def _worker_main(conn, preload: List[str], memory_mb: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    modules: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+    for path in preload:
+        try:
+            _load_module(path, modules)
+        except Exception:
+            pass  # reported on first call instead
+    _limit_memory(memory_mb)
+    while True:
+        try:
+            path, name, args, kwargs, cpu_seconds = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            _limit_cpu(cpu_seconds)
+            fn = getattr(_load_module(path, modules), name)
+            reply = ("ok", getattr(fn, "func", fn)(*args, **kwargs))
+        except BaseException as e:  # MemoryError, RecursionError and CPU limit included
+            reply = ("error", type(e).__name__, str(e)[:500])
+        finally:
+            _limit_cpu(None)
+        try:
+            conn.send(reply)
+        except Exception as e:  # unpicklable result
+            conn.send(("error", type(e).__name__, str(e)[:500]))
+
+
+# ---- parent side -------------------------------------------------------------
+
+def _context():
+    # forkserver forks workers from a clean, single-threaded server process
+    # (plain fork would copy the API process's threads and locks). Preloading
+    # langchain there makes each fork, including respawns, start warm.
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(["sandbox", "langchain_core.tools"])
+    return ctx
+
+
+class _Worker:
+    def __init__(self, ctx, preload: List[str], memory_mb: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, preload, memory_mb),
+                                   name="tool-sandbox", daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+# Fixed-size pool of worker processes. A call takes an idle worker (waiting if
+# all are busy, which also bounds concurrent tool CPU to the pool size), sends
+# one request over its pipe and waits up to `timeout` for the reply.
+class SandboxPool:
+    def __init__(self, size: int = SANDBOX_WORKERS, preload: Optional[List[str]] = None,
+                 timeout: float = SANDBOX_TIMEOUT, cpu_seconds: int = SANDBOX_CPU_SECONDS,
+                 memory_mb: int = SANDBOX_MEMORY_MB):
+        self.size = size
+        self.preload = [os.path.abspath(p) for p in (preload if preload is not None else SANDBOX_TOOL_FILES)
+                        if os.path.exists(p)]
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._ctx = _context()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._stats = {"calls": 0, "errors": 0, "timeouts": 0, "respawns": 0, "total_s": 0.0}
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        logger.info(json.dumps({"event": "sandbox_started", "workers": size, "preload": self.preload}))
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.preload, self.memory_mb)
+
+    def _count(self, key: str, elapsed: float = 0.0) -> None:
+        with self._lock:
+            self._stats[key] += 1
+            self._stats["total_s"] += elapsed
+
+    def call(self, path: str, name: str, args: Tuple[Any, ...] = (), kwargs: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = None) -> Any:
+        if self._closed:
+            raise SandboxError("Tool sandbox is shut down")
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            worker.conn.send((os.path.abspath(path), name, tuple(args), kwargs or {}, self.cpu_seconds))
+            if not worker.conn.poll(timeout):
+                raise SandboxTimeout(f"Tool '{name}' timed out after {timeout:g}s")
+            reply = worker.conn.recv()
+        except SandboxTimeout:
+            worker = self._replace(worker)
+            self._count("timeouts", time.perf_counter() - start)
+            logger.warning(json.dumps({"event": "sandbox_timeout", "tool_name": name, "timeout": timeout}))
+            raise
+        except (EOFError, OSError) as e:
+            # Killed by the kernel (hard CPU or memory limit) mid-call.
+            worker = self._replace(worker)
+            self._count("errors", time.perf_counter() - start)
+            logger.warning(json.dumps({"event": "sandbox_worker_died", "tool_name": name, "error": str(e)}))
+            raise SandboxError(f"Tool '{name}' crashed its sandbox worker") from None
+        finally:
+            self._idle.put(worker)
+        if reply[0] == "ok":
+            self._count("calls", time.perf_counter() - start)
+            return reply[1]
+        self._count("errors", time.perf_counter() - start)
+        raise SandboxError(f"Tool '{name}' failed: {reply[1]}: {reply[2]}")
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        self._count("respawns")
+        return self._spawn()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        finished = stats["calls"] + stats["errors"] + stats["timeouts"]
+        return {
+            "workers": self.size,
+            "idle": self._idle.qsize(),
+            "calls": stats["calls"],
+            "errors": stats["errors"],
+            "timeouts": stats["timeouts"],
+            "respawns": stats["respawns"],
+            "avg_ms": 1000 * stats["total_s"] / finished if finished else 0.0,
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_sandbox: Optional[SandboxPool] = None
+_sandbox_lock = threading.Lock()
+
+# Shared pool, started on first use with every worker forked and preloaded up
+# front, so no call pays for process start-up or tool imports.
+def get_sandbox() -> SandboxPool:
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                _sandbox = SandboxPool()
+                atexit.register(_sandbox.close)
+    return _sandbox
+
+
+def sandbox_stats() -> Dict[str, Any]:
+    return _sandbox.stats() if _sandbox is not None else {}
+
+
+def is_sandboxed(path: str) -> bool:
+    return SANDBOX and os.path.abspath(path) in {os.path.abspath(p) for p in SANDBOX_TOOL_FILES}
+
+
+# Tool copy whose function runs in the sandbox. Only the file path and name
+# cross the pipe; the worker resolves the function from its own import.
+def sandboxed_tool(tool_fn: Any, path: str, name: str) -> Any:
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return get_sandbox().call(path, name, args, kwargs)
+    return tool_fn.model_copy(update={"func": run, "handle_tool_error": True})
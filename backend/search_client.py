@@ -0,0 +1,186 @@
+import asyncio
+import http.client
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from langchain_core.tools import ToolException
+
+logger = logging.getLogger("agent")
+
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "3"))
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "4"))
+
+
+# ToolExceptions, so tools built with handle_tool_error=True hand them back to
+# the agent as the tool's output instead of aborting the run.
+class SearchError(ToolException):
+    pass
+
+
+class SearchTimeout(SearchError):
+    pass
+
+
+# Keeps up to pool_size DDGS sessions alive between calls instead of opening a
+# new one per search, and asks DuckDuckGo for max_results only.
+class DDGSBackend:
+    def __init__(self, pool_size: int = SEARCH_POOL_SIZE, timeout: float = SEARCH_TIMEOUT):
+        self.timeout = timeout
+        self._sessions: "queue.LifoQueue[Any]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self._sessions.get_nowait()
+        except queue.Empty:
+            from ddgs import DDGS
+            return DDGS(timeout=int(self.timeout))
+
+    def _release(self, session) -> None:
+        try:
+            self._sessions.put_nowait(session)
+        except queue.Full:
+            pass
+
+    def search(self, query: str, max_results: int) -> List[str]:
+        session = self._acquire()
+        # On error the session is dropped rather than returned to the pool.
+        results = session.text(query, max_results=max_results)
+        self._release(session)
+        return [r["body"] for r in results][:max_results]
+
+
+# Minimal JSON search backend over persistent HTTP connections:
+# GET {base_url}?q=...&max_results=N -> [{"body": ...}, ...]. Used with the local
+# stand-in server in benchmarks/bench_search_client.py and for self-hosted
+# search proxies.
+class HTTPJSONBackend:
+    def __init__(self, base_url: str, pool_size: int = SEARCH_POOL_SIZE, timeout: float = SEARCH_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self._connections: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return cls(self.host, self.port, timeout=self.timeout)
+
+    def search(self, query: str, max_results: int) -> List[str]:
+        conn = self._acquire()
+        try:
+            conn.request("GET", f"{self.path}?{urlencode({'q': query, 'max_results': max_results})}")
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise SearchError(f"Search backend returned HTTP {response.status}")
+        except Exception:
+            conn.close()
+            raise
+        try:
+            self._connections.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return [r["body"] for r in json.loads(body)][:max_results]
+
+
+# Search front end shared by the sync and async tool paths.
+#
+# Fetches run on a small thread pool. Identical queries that are already in
+# flight share one Future, so concurrent users asking the same thing cause a
+# single backend fetch. Every caller waits at most `timeout` seconds; a hung
+# fetch only blocks its pool thread until the backend's own socket timeout.
+class SearchClient:
+    def __init__(self, backend: Any, max_results: int = SEARCH_MAX_RESULTS, timeout: float = SEARCH_TIMEOUT,
+                 max_workers: int = SEARCH_POOL_SIZE):
+        self.backend = backend
+        self.max_results = max_results
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "fetches": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+
+    def _submit(self, query: str) -> Future:
+        key = (" ".join(query.lower().split()), self.max_results)
+        with self._lock:
+            self._stats["requests"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future
+            self._stats["fetches"] += 1
+            future = self._executor.submit(self.backend.search, query, self.max_results)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key: Tuple[str, int], future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.exception() is not None:
+                self._stats["errors"] += 1
+
+    def _timed_out(self, query: str) -> SearchTimeout:
+        with self._lock:
+            self._stats["timeouts"] += 1
+        logger.error(json.dumps({"event": "search_timeout", "query": query[:100], "timeout": self.timeout}))
+        return SearchTimeout(f"Search timed out after {self.timeout:g}s")
+
+    @staticmethod
+    def _failed(error: Exception) -> SearchError:
+        if isinstance(error, SearchError):
+            return error
+        return SearchError(f"Search failed: {type(error).__name__}: {error}")
+
+    def search(self, query: str) -> str:
+        future = self._submit(query)
+        try:
+            return "\n".join(future.result(timeout=self.timeout))
+        except FutureTimeoutError:
+            raise self._timed_out(query) from None
+        except Exception as e:
+            raise self._failed(e) from e
+
+    async def asearch(self, query: str) -> str:
+        future = self._submit(query)
+        try:
+            # shield: one caller timing out must not cancel the fetch other callers share.
+            results = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(query) from None
+        except Exception as e:
+            raise self._failed(e) from e
+        return "\n".join(results)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "inflight": len(self._inflight)}
+
+
+_client: Optional[SearchClient] = None
+_client_lock = threading.Lock()
+
+def get_search_client() -> SearchClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SearchClient(DDGSBackend())
+    return _client
+
+def set_search_client(client: SearchClient) -> None:
+    global _client
+    _client = client
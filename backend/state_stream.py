@@ -0,0 +1,96 @@
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional: plain json is used when orjson is not installed
+    orjson = None
+
+
+def serialize_message(msg: Any) -> Dict[str, Any]:
+    if isinstance(msg, dict):
+        return {
+            "type": msg.get("type", msg.__class__.__name__),
+            "content": msg.get("content", ""),
+            "additional_kwargs": msg.get("additional_kwargs", {}),
+            "response_metadata": msg.get("response_metadata", {}),
+            "id": msg.get("id"),
+        }
+    return {
+        "type": getattr(msg, "type", msg.__class__.__name__),
+        "content": msg.content,
+        "additional_kwargs": msg.additional_kwargs,
+        "response_metadata": msg.response_metadata,
+        "id": getattr(msg, "id", None),
+    }
+
+
+# Frame -> bytes for the wire. orjson is several times faster than json for
+# these payloads; default=str covers anything non-JSON in message metadata.
+def encode_frame(frame: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(frame, default=str)
+    return json.dumps(frame, default=str, separators=(",", ":")).encode()
+
+
+# Turns successive graph states into a delta stream.
+#
+#   {"event": "state_snapshot", "seq": n, "state": {...}}
+#   {"event": "state_delta", "seq": n, "base_seq": n - 1,
+#    "append": [new messages], "set": {changed fields}}
+#
+# Every frame has a seq one higher than the previous one. A client applies
+# a delta only when base_seq equals the last seq it applied. On a gap, or on
+# reconnect, it asks for a resync and the next frame is a full snapshot.
+# Snapshots are also sent whenever history is rewritten rather than appended.
+class StateStream:
+    def __init__(self, mode: str = "delta"):
+        self.mode = mode
+        self.seq = 0
+        self._resync = True
+        self._sent_messages = 0
+        self._last_id: Optional[str] = None
+        self._fields: Dict[str, Any] = {}
+
+    def request_resync(self) -> None:
+        self._resync = True
+
+    def _snapshot(self, messages: List[Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+        self._resync = False
+        self._remember(messages, fields)
+        state = dict(fields)
+        state["messages"] = [serialize_message(m) for m in messages]
+        return {"event": "state_snapshot", "seq": self.seq, "state": state}
+
+    def _remember(self, messages: List[Any], fields: Dict[str, Any]) -> None:
+        self._sent_messages = len(messages)
+        self._last_id = getattr(messages[-1], "id", None) if messages else None
+        self._fields = fields
+
+    # Next frame for `state` (an AgentState or a dict of its fields), or None
+    # if nothing changed since the previous frame.
+    def frame(self, state: Any) -> Optional[Dict[str, Any]]:
+        fields = dict(state) if isinstance(state, dict) else dict(state.__dict__)
+        messages = list(fields.pop("messages", None) or [])
+        if self.mode != "delta":
+            self.seq += 1
+            frame = self._snapshot(messages, fields)
+            frame["event"] = "state_update"
+            return frame
+        sent = self._sent_messages
+        rewritten = len(messages) < sent or (sent and getattr(messages[sent - 1], "id", None) != self._last_id)
+        if self._resync or rewritten:
+            self.seq += 1
+            return self._snapshot(messages, fields)
+        changed = {k: v for k, v in fields.items() if self._fields.get(k) != v or k not in self._fields}
+        appended = messages[sent:]
+        if not changed and not appended:
+            return None
+        self.seq += 1
+        self._remember(messages, fields)
+        frame: Dict[str, Any] = {"event": "state_delta", "seq": self.seq, "base_seq": self.seq - 1}
+        if appended:
+            frame["append"] = [serialize_message(m) for m in appended]
+        if changed:
+            frame["set"] = changed
+        return frame
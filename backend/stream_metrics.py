@@ -0,0 +1,53 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+WINDOW = 1000  # most recent samples kept per metric
+
+
+# Rolling latency window (e.g. time to first token) with percentile summaries.
+class LatencyWindow:
+    def __init__(self, size: int = WINDOW):
+        self.count = 0
+        self._samples: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self._samples.append(seconds)
+
+    # Latency in seconds at quantile q (0..1), or None without samples.
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self._samples)
+            count = self.count
+
+        def pct(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return 1000 * ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+        return {"count": count, "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99), "max_ms": pct(100)}
+
+
+_windows: Dict[str, LatencyWindow] = {}
+_windows_lock = threading.Lock()
+
+def observe_latency(name: str, seconds: float) -> None:
+    window = _windows.get(name)
+    if window is None:
+        with _windows_lock:
+            window = _windows.setdefault(name, LatencyWindow())
+    window.observe(seconds)
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: window.stats() for name, window in list(_windows.items())}
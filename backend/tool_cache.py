@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger("agent")
+
+DEFAULT_MAXSIZE = 256
+SEARCH_TTL = 300  # seconds; web results go stale, arithmetic does not
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_part(part: str) -> str:
+    part = _WHITESPACE_RE.sub(" ", part.strip())
+    try:
+        return repr(float(part))
+    except ValueError:
+        return part
+
+
+# Tools take one "a,b"-style string. For tools that declare numeric input
+# (they parse every field with float()), "4, 5", "4,5" and "4.0,5" share a
+# cache entry. Any other string is only stripped: "007" and "7" stay apart, as
+# do integers too large for a float to tell apart.
+def normalize_args(args: Tuple[Any, ...], kwargs: Dict[str, Any], numeric: bool = False) -> Hashable:
+    def norm(value: Any) -> Hashable:
+        if isinstance(value, str):
+            return tuple(_normalize_part(p) for p in value.split(",")) if numeric else value.strip()
+        if isinstance(value, dict):
+            return tuple(sorted((k, norm(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(norm(v) for v in value)
+        return value
+    return norm(args), norm(kwargs)
+
+
+# Bounded LRU with an optional per-entry TTL and hit/miss counters.
+class ToolResultCache:
+    def __init__(self, name: str, maxsize: int = DEFAULT_MAXSIZE, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (self.ttl is None or time.monotonic() - item[0] < self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+_caches: Dict[str, ToolResultCache] = {}
+
+
+# Opt-in memoization for deterministic tools. Goes under @tool so LangChain
+# still sees the original name, docstring and signature:
+#
+#     @tool
+#     @cached_tool(numeric=True)
+#     def addition(input: str) -> float: ...
+#
+# numeric=True canonicalises the comma-separated fields as floats, see
+# normalize_args. Exceptions are never cached. Works for sync and async
+# functions.
+def cached_tool(maxsize: int = DEFAULT_MAXSIZE, ttl: Optional[float] = None, name: Optional[str] = None,
+                numeric: bool = False) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+        # An explicit name shares one cache between e.g. the sync and async
+        # implementations of the same tool.
+        cache = _caches.get(name) if name else None
+        if cache is None:
+            cache = ToolResultCache(name or fn.__name__, maxsize=maxsize, ttl=ttl)
+            _caches[cache.name] = cache
+
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = normalize_args(args, kwargs, numeric)
+                hit, value = cache.get(key)
+                if hit:
+                    return value
+                value = await fn(*args, **kwargs)
+                cache.put(key, value)
+                return value
+            async_wrapper.cache = cache
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = normalize_args(args, kwargs, numeric)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = fn(*args, **kwargs)
+            cache.put(key, value)
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def clear_caches() -> None:
+    for cache in _caches.values():
+        cache.clear()
@@ -0,0 +1,232 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from registry_store import ToolRegistryStore, get_registry, DEFAULT_REGISTRY_PATH
+
+logger = logging.getLogger("agent")
+
+TOOLS_FILE = "tools/generated_tools.py"
+
+# Replaces single-assignment temporaries with the expression they were assigned,
+# so `parts = input.split(','); return float(parts[0])` and
+# `return float(input.split(',')[0])` normalise to the same tree.
+class _Inliner(ast.NodeTransformer):
+    def __init__(self, bindings: Dict[str, ast.expr]):
+        self.bindings = bindings
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if isinstance(node.ctx, ast.Load) and node.id in self.bindings:
+            return self.bindings[node.id]
+        return node
+
+
+# float() already ignores surrounding whitespace, so float(x.strip()) == float(x).
+class _StripFolder(ast.NodeTransformer):
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id in ("float", "int") and len(node.args) == 1:
+            arg = node.args[0]
+            if (isinstance(arg, ast.Call) and isinstance(arg.func, ast.Attribute)
+                    and arg.func.attr == "strip" and not arg.args):
+                node.args = [arg.func.value]
+        return node
+
+
+# Canonical names for the variables a body binds itself (assignment, loop and
+# comprehension targets, lambda arguments, `except ... as`). Free names such as
+# sqrt, floor or pi are part of the behaviour and are left as they are.
+def _bound_names(body: List[ast.stmt]) -> set:
+    bound = set()
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                bound.add(node.id)
+            elif isinstance(node, ast.arg):
+                bound.add(node.arg)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                bound.add(node.name)
+    bound.discard("input")
+    return bound
+
+
+class _Renamer(ast.NodeTransformer):
+    def __init__(self, bound: set):
+        self.bound = bound
+        self.names: Dict[str, str] = {}
+
+    def _rename(self, name: str) -> str:
+        if name not in self.bound:
+            return name
+        if name not in self.names:
+            self.names[name] = f"v{len(self.names)}"
+        return self.names[name]
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        return ast.copy_location(ast.Name(id=self._rename(node.id), ctx=node.ctx), node)
+
+    def visit_arg(self, node: ast.arg) -> ast.AST:
+        node.arg = self._rename(node.arg)
+        return node
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> ast.AST:
+        self.generic_visit(node)
+        if node.name:
+            node.name = self._rename(node.name)
+        return node
+
+
+def _assign_counts(body: List[ast.stmt]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                counts[node.id] = counts.get(node.id, 0) + 1
+    return counts
+
+
+def _inline_temporaries(body: List[ast.stmt]) -> List[ast.stmt]:
+    counts = _assign_counts(body)
+    bindings: Dict[str, ast.expr] = {}
+    result = []
+    for stmt in body:
+        stmt = _Inliner(bindings).visit(stmt)
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+            target = stmt.targets[0]
+            if isinstance(target, ast.Name) and counts.get(target.id) == 1:
+                bindings[target.id] = stmt.value
+                continue
+            if (isinstance(target, ast.Tuple) and all(isinstance(e, ast.Name) and counts.get(e.id) == 1 for e in target.elts)):
+                for i, element in enumerate(target.elts):
+                    bindings[element.id] = ast.Subscript(value=stmt.value, slice=ast.Constant(value=i), ctx=ast.Load())
+                continue
+        result.append(stmt)
+    return result
+
+
+def _strip_docstring(body: List[ast.stmt]) -> List[ast.stmt]:
+    if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        return body[1:]
+    return body
+
+
+def normalize_body(body: List[ast.stmt]) -> str:
+    body = _inline_temporaries(_strip_docstring(body))
+    module = ast.Module(body=body, type_ignores=[])
+    module = _StripFolder().visit(module)
+    module = _Renamer(_bound_names(body)).visit(module)
+    return ast.dump(module, annotate_fields=False)
+
+
+# Bumped whenever normalisation changes; registry entries that stored a
+# fingerprint from another version are re-fingerprinted from their source.
+FINGERPRINT_VERSION = "2"
+
+
+def fingerprint_body(body: List[ast.stmt]) -> str:
+    return f"{FINGERPRINT_VERSION}:" + hashlib.sha256(normalize_body(body).encode()).hexdigest()[:16]
+
+
+# Fingerprint of a tool_generator body (the one-line PYTHON_LOGIC).
+def fingerprint_source(source: str) -> str:
+    return fingerprint_body(ast.parse(source.strip()).body)
+
+
+_module_fingerprints: Dict[str, Tuple[Tuple[int, int], Dict[str, str]]] = {}
+
+# Fingerprints of every function in a tools file, cached until the file changes.
+def module_fingerprints(path: str) -> Dict[str, str]:
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _module_fingerprints.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    fingerprints = {
+        node.name: fingerprint_body(node.body)
+        for node in tree.body if isinstance(node, ast.FunctionDef)
+    }
+    _module_fingerprints[path] = (signature, fingerprints)
+    return fingerprints
+
+
+def entry_fingerprint(entry: Dict) -> Optional[str]:
+    if entry.get("fingerprint", "").startswith(f"{FINGERPRINT_VERSION}:"):
+        return entry["fingerprint"]
+    t_file = entry.get("saved_in")
+    if not t_file or not os.path.exists(t_file):
+        return None
+    return module_fingerprints(t_file).get(entry["name"])
+
+
+# First registered tool whose body normalises to the same fingerprint, if any.
+def find_equivalent(registry: ToolRegistryStore, fingerprint: str) -> Optional[Dict]:
+    for entry in registry.entries():
+        if entry_fingerprint(entry) == fingerprint:
+            return entry
+    return None
+
+
+def _remove_functions(path: str, names: List[str]) -> None:
+    with open(path) as f:
+        source = f.read()
+    lines = source.splitlines(keepends=True)
+    drop = set()
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            start = min([d.lineno for d in node.decorator_list] + [node.lineno]) - 1
+            end = node.end_lineno
+            # Take the blank separator line with the function.
+            if end < len(lines) and not lines[end].strip():
+                end += 1
+            drop.update(range(start, end))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(line for i, line in enumerate(lines) if i not in drop)
+    os.replace(tmp_path, path)
+
+
+# Merges generated tools that share a fingerprint: the earliest registration is
+# kept, later duplicates are removed from the registry and from the tools file.
+# Returns {removed tool name: kept tool name}.
+def compact(registry: ToolRegistryStore, tools_file: str = TOOLS_FILE, dry_run: bool = False) -> Dict[str, str]:
+    kept: Dict[str, str] = {}
+    merged: Dict[str, str] = {}
+    for entry in registry.entries():
+        if os.path.normpath(entry.get("saved_in", "")) != os.path.normpath(tools_file):
+            continue
+        fp = entry_fingerprint(entry)
+        if fp is None:
+            continue
+        if fp in kept:
+            merged[entry["name"]] = kept[fp]
+        else:
+            kept[fp] = entry["name"]
+    if merged and not dry_run:
+        _remove_functions(tools_file, list(merged))
+        for name in merged:
+            registry.delete(name)
+        registry.compact()
+    logger.info(json.dumps({"event": "tools_compacted", "merged": merged, "dry_run": dry_run}))
+    return merged
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge duplicate generated tools")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_PATH)
+    parser.add_argument("--tools-file", default=TOOLS_FILE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    merged = compact(get_registry(args.registry), args.tools_file, dry_run=args.dry_run)
+    for removed, kept_name in merged.items():
+        print(f"{removed} -> {kept_name}")
+    if not merged:
+        print("No duplicate tools found.")
@@ -0,0 +1,327 @@
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from registry_store import ToolRegistryStore
+
+logger = logging.getLogger("agent")
+
+EMBEDDINGS_PATH = os.getenv("TOOL_EMBEDDINGS_PATH", "tools/tool_embeddings.npz")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("_", " "))
+
+
+# Offline stand-in for GoogleGenerativeAIEmbeddings. Hashes word and character
+# trigram features into a fixed-size signed vector, so it needs no network and
+# always returns the same vector for the same text.
+class HashingEmbeddings:
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            features = [token] + [token[i:i + 3] for i in range(max(len(token) - 2, 0))]
+            for feature in features:
+                h = zlib.crc32(feature.encode())
+                vec[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+_embedding_model: Any = None
+
+def set_embedding_model(embedding: Any) -> None:
+    global _embedding_model
+    _embedding_model = embedding
+    _indexes.clear()
+
+def get_embedding_model() -> Any:
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = HashingEmbeddings()
+    return _embedding_model
+
+def _model_id(embedding: Any) -> str:
+    return str(getattr(embedding, "model", type(embedding).__name__))
+
+
+# Persistent description-hash -> vector cache, so tool descriptions are only
+# sent to the embedding model once across restarts.
+class EmbeddingCache:
+    def __init__(self, path: str):
+        self.path = path
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                data = np.load(path)
+                self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+            except Exception as e:
+                logger.error(json.dumps({"event": "embedding_cache_load_error", "path": path, "error": str(e)}))
+
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\n{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self._vectors.get(key)
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        self._vectors[key] = vector
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty or not self._vectors:
+            return
+        keys = list(self._vectors)
+        vectors = np.stack([self._vectors[k] for k in keys])
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), vectors=vectors)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+# Cosine-similarity index over tool descriptions. Rows are L2-normalised, so a
+# query is a single matrix-vector product. The index follows the registry
+# change log and only embeds tools added since the last sync.
+class EmbeddingIndex:
+    def __init__(self, registry: ToolRegistryStore, embedding: Any, cache: EmbeddingCache):
+        self.registry = registry
+        self.embedding = embedding
+        self.cache = cache
+        self.model_id = _model_id(embedding)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._names: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+
+    def sync(self) -> None:
+        changes = self.registry.changes_since(self._version)
+        if not changes:
+            return
+        with self._lock:
+            changes = self.registry.changes_since(self._version)
+            pending: Dict[str, Dict[str, Any]] = {}
+            for op, entry in changes:
+                if op == "reset":
+                    self._names, self._rows, self._matrix = [], {}, None
+                    pending.clear()
+                elif op == "add":
+                    pending[entry["name"]] = entry
+                elif op == "delete":
+                    pending.pop(entry["name"], None)
+                    self._remove(entry["name"])
+            if pending:
+                self._add(list(pending.values()))
+            self._version += len(changes)
+
+    def _add(self, entries: List[Dict[str, Any]]) -> None:
+        texts = [e.get("description", "") or e["name"] for e in entries]
+        keys = [EmbeddingCache.key(self.model_id, t) for t in texts]
+        missing = [i for i, k in enumerate(keys) if self.cache.get(k) is None]
+        if missing:
+            vectors = self.embedding.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                v = np.asarray(vector, dtype=np.float32)
+                self.cache.put(keys[i], v / (np.linalg.norm(v) or 1.0))
+            self.cache.save()
+            logger.info(json.dumps({"event": "tool_embeddings_computed", "count": len(missing)}))
+        for entry in entries:
+            self._remove(entry["name"])
+        rows = np.stack([self.cache.get(k) for k in keys])
+        names = self._names + [entry["name"] for entry in entries]
+        for row, entry in enumerate(entries, start=len(self._names)):
+            self._rows[entry["name"]] = row
+        self._names, self._matrix = names, rows if self._matrix is None else np.vstack([self._matrix, rows])
+
+    # Copy-on-write: search holds on to the old matrix and names list, so
+    # they are replaced, never changed in place.
+    def _remove(self, name: str) -> None:
+        row = self._rows.pop(name, None)
+        if row is None:
+            return
+        # Swap the last row into the hole to keep the matrix dense.
+        last = len(self._names) - 1
+        names, matrix = self._names[:last], self._matrix[:last].copy() if last else None
+        if row != last:
+            matrix[row] = self._matrix[last]
+            names[row] = self._names[last]
+            self._rows[names[row]] = row
+        self._names, self._matrix = names, matrix
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0) -> List[Tuple[Dict[str, Any], float]]:
+        self.sync()
+        with self._lock:
+            matrix, names = self._matrix, self._names
+        if matrix is None or not query.strip():
+            return []
+        q = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = matrix @ q
+        k = min(k, len(names))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            entry = self.registry.get(names[i])
+            if entry is not None and scores[i] >= min_score:
+                results.append((entry, float(scores[i])))
+        return results
+
+
+_indexes: Dict[int, EmbeddingIndex] = {}
+_indexes_lock = threading.Lock()
+_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_index(registry: ToolRegistryStore) -> EmbeddingIndex:
+    global _cache
+    index = _indexes.get(id(registry))
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(id(registry))
+        if index is None:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBEDDINGS_PATH)
+            index = EmbeddingIndex(registry, get_embedding_model(), _cache)
+            _indexes[id(registry)] = index
+        return index
+
+
+# Okapi BM25 over tokenized tool names and descriptions. Postings map a token to
+# {tool name: term frequency}, so a query only touches the tools that share a
+# term with it instead of scanning the whole registry.
+class BM25Index:
+    def __init__(self, registry: Optional[ToolRegistryStore] = None, k1: float = 1.5, b: float = 0.75):
+        self.registry = registry
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._version = 0
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def sync(self) -> None:
+        if self.registry is None:
+            return
+        changes = self.registry.changes_since(self._version)
+        if not changes:
+            return
+        with self._lock:
+            changes = self.registry.changes_since(self._version)
+            for op, entry in changes:
+                if op == "reset":
+                    self._postings.clear()
+                    self._doc_terms.clear()
+                    self._doc_len.clear()
+                    self._entries.clear()
+                    self._total_len = 0
+                elif op == "add":
+                    self.add(entry)
+                elif op == "delete":
+                    self.remove(entry["name"])
+            self._version += len(changes)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        name = entry["name"]
+        self.remove(name)
+        terms: Dict[str, int] = defaultdict(int)
+        for token in tokenize(name) + tokenize(entry.get("description", "")):
+            terms[token] += 1
+        for token, tf in terms.items():
+            self._postings[token][name] = tf
+        self._doc_terms[name] = dict(terms)
+        self._doc_len[name] = sum(terms.values())
+        self._entries[name] = entry
+        self._total_len += self._doc_len[name]
+
+    def remove(self, name: str) -> None:
+        terms = self._doc_terms.pop(name, None)
+        if terms is None:
+            return
+        for token in terms:
+            posting = self._postings[token]
+            posting.pop(name, None)
+            if not posting:
+                del self._postings[token]
+        self._entries.pop(name, None)
+        self._total_len -= self._doc_len.pop(name)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        self.sync()
+        # Scored under the lock: sync() changes the postings in place when a
+        # tool is added from another thread.
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: Dict[str, float] = defaultdict(float)
+            for token in set(tokenize(query)):
+                posting = self._postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for name, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[name] / avg_len)
+                    scores[name] += idf * tf * (self.k1 + 1) / (tf + norm)
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(self._entries[name], score) for name, score in top]
+
+
+_bm25_indexes: Dict[int, BM25Index] = {}
+
+def get_bm25_index(registry: ToolRegistryStore) -> BM25Index:
+    index = _bm25_indexes.get(id(registry))
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _bm25_indexes.get(id(registry))
+        if index is None:
+            index = BM25Index(registry)
+            _bm25_indexes[id(registry)] = index
+        return index
+
+# Reciprocal-rank fusion of BM25 and embedding results. BM25 alone is used when
+# the embedding model is unavailable (offline, quota errors).
+def hybrid_search(registry: ToolRegistryStore, query: str, limit: int = 5, min_score: float = 0.3) -> List[Dict[str, Any]]:
+    ranked_lists = [[entry for entry, _ in get_bm25_index(registry).search(query, limit=limit)]]
+    try:
+        ranked_lists.append([entry for entry, _ in get_embedding_index(registry).search(query, k=limit, min_score=min_score)])
+    except Exception as e:
+        logger.error(json.dumps({"event": "semantic_search_error", "error": str(e)}))
+    fused: Dict[str, float] = defaultdict(float)
+    entries: Dict[str, Dict[str, Any]] = {}
+    for ranked in ranked_lists:
+        for rank, entry in enumerate(ranked):
+            fused[entry["name"]] += 1.0 / (60 + rank)
+            entries[entry["name"]] = entry
+    return [entries[name] for name in sorted(fused, key=fused.get, reverse=True)[:limit]]
@@ -1,19 +1,36 @@
-from langchain_core.tools import tool
-from ddgs import DDGS
+from langchain_core.tools import tool, StructuredTool
 from datetime import datetime
 import os
-import yaml
+from registry_store import get_registry
+from tool_search import hybrid_search
+from tool_dedup import fingerprint_source, find_equivalent
+from tool_cache import cached_tool, SEARCH_TTL
+from search_client import get_search_client
+from batch_tools import make_batch_tool
 
 REGISTRY_PATH = "tools/tool_registry.yaml"
 TOOLS_FILE = "tools/generated_tools.py"
+LOOKUP_TOP_K = 5
+LOOKUP_MIN_SCORE = 0.3
 
-@tool
-def search_duckduckgo(query: str) -> str:
+@cached_tool(ttl=SEARCH_TTL, name="search_duckduckgo")
+def _search_duckduckgo(query: str) -> str:
+    """Search the web for current or general knowledge using DuckDuckGo."""
+    return get_search_client().search(query)
+
+@cached_tool(ttl=SEARCH_TTL, name="search_duckduckgo")
+async def _asearch_duckduckgo(query: str) -> str:
     """Search the web for current or general knowledge using DuckDuckGo."""
-    with DDGS() as ddgs:
-        results = ddgs.text(query)
-        top_results = [r["body"] for r in results][:3]
-        return "\n".join(top_results)
+    return await get_search_client().asearch(query)
+
+# Sync and async entry points share the pooled, coalescing search client; timeouts
+# come back to the agent as a tool error instead of stalling it.
+search_duckduckgo = StructuredTool.from_function(
+    func=_search_duckduckgo,
+    coroutine=_asearch_duckduckgo,
+    name="search_duckduckgo",
+    handle_tool_error=True,
+)
 
 
 @tool
@@ -32,6 +49,9 @@ def tool_generator(input: str) -> str:
     - `TOOL_DESCRIPTION`: what it does + how to provide input
     - `return_type`: float, str, bool, or int
     - `PYTHON_LOGIC`: one-liner using the 'input' variable
+    - Optional `cacheable: true` (plus `cache_ttl: SECONDS`) for pure functions whose results can be reused
+    - Optional `numeric_input: true` when the body parses every comma-separated field of `input` as a float,
+      so "4,5" and "4.0, 5" share a cached result
     """
 
 
@@ -49,15 +69,17 @@ def tool_generator(input: str) -> str:
         description = params["description"]
         function_body = params["body"]
 
-        if os.path.exists(REGISTRY_PATH):
-            with open(REGISTRY_PATH) as f:
-                registry = yaml.safe_load(f) or []
-        else:
-            registry = []
+        registry = get_registry(REGISTRY_PATH)
 
-        if any(t["name"] == name for t in registry):
+        if registry.exists(name):
             return f"❌ Tool '{name}' already exists. Choose a different name."
 
+        # Same logic under a different name: hand back the existing tool instead of a duplicate.
+        fingerprint = fingerprint_source(function_body)
+        equivalent = find_equivalent(registry, fingerprint)
+        if equivalent:
+            return f"♻️ Equivalent tool '{equivalent['name']}' already exists ({equivalent.get('description', '')}). Use it instead."
+
 
         # --- Code generation ---
         tool_code = f'''
@@ -80,19 +102,17 @@ def {name}(input: str) -> float:
             "name": name,
             "description": description,
             "saved_in": TOOLS_FILE,
+            "fingerprint": fingerprint,
             "created_at": datetime.now().isoformat(),
         }
+        if params.get("cacheable", "").lower() == "true":
+            tool_entry["cacheable"] = True
+            if params.get("cache_ttl"):
+                tool_entry["cache_ttl"] = float(params["cache_ttl"])
+            if params.get("numeric_input", "").lower() == "true":
+                tool_entry["numeric_input"] = True
 
-        if os.path.exists(REGISTRY_PATH):
-            with open(REGISTRY_PATH) as f:
-                registry = yaml.safe_load(f) or []
-        else:
-            registry = []
-
-        registry.append(tool_entry)
-
-        with open(REGISTRY_PATH, "w") as f:
-            yaml.dump(registry, f)
+        registry.add(tool_entry)
 
         return f"✅ Tool '{name}' created and metadata saved."
 
@@ -104,29 +124,49 @@ def {name}(input: str) -> float:
 def tool_lookup(input: str) -> str:
     """
     Searches for existing tools in the registry that match the given keyword or phrase.
+    Results are ranked best match first. Multi-word queries are supported, and an
+    optional result limit can be appended after a pipe.
 
     Example input:
     "square root"
+    "divide two numbers | limit: 3"
     
     Returns a list of matching tools with their name and description.
     """
-    keyword = input.strip().lower()
-
-    if not os.path.exists(REGISTRY_PATH):
-        return f"⚠️ Tool registry not found at {REGISTRY_PATH}"
-
-    with open(REGISTRY_PATH) as f:
-        registry = yaml.safe_load(f) or []
-
-    matches = []
-    for tool in registry:
-        name = tool.get("name", "").lower()
-        desc = tool.get("description", "").lower()
-
-        if keyword in name or keyword in desc:
-            matches.append(f"- {tool['name']}: {tool['description']}")
+    query, _, options = input.partition("|")
+    keyword = query.strip().lower()
+    limit = LOOKUP_TOP_K
+    if options.strip().lower().startswith("limit:"):
+        try:
+            limit = max(1, int(options.split(":", 1)[1]))
+        except ValueError:
+            pass
+
+    registry = get_registry(REGISTRY_PATH)
+    if not len(registry):
+        return f"⚠️ Tool registry not found or empty at {REGISTRY_PATH}"
+
+    # BM25 ranks exact terms, embeddings catch paraphrases ("quotient" vs "divide").
+    matches = [
+        f"- {tool['name']}: {tool['description']}"
+        for tool in hybrid_search(registry, keyword, limit=limit, min_score=LOOKUP_MIN_SCORE)
+    ]
 
     if matches:
         return f"🔍 Matching tools:\n" + "\n".join(matches)
     else:
         return f"❌ No tools found matching: '{keyword}'"
+
+
+# Batch runs resolve registry tools through agent.load_tool, so generated tools
+# keep their sandbox for the rows that cannot be vectorized. agent is imported
+# lazily: it is the module that loads this file.
+def _batch_target(name: str):
+    import agent
+
+    entry = get_registry(REGISTRY_PATH).get(name)
+    if not entry:
+        raise ValueError(f"Tool '{name}' not found in registry")
+    return agent.load_tool(REGISTRY_PATH, tool_name=name)[0], entry.get("saved_in")
+
+batch_apply = make_batch_tool(_batch_target)